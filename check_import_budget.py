@@ -0,0 +1,57 @@
+"""
+Cold-start import budget.
+Each target is imported in a fresh interpreter (best of N runs) and compared to its budget:
+    python check_import_budget.py
+Exit code 1 if any target is over budget.
+"""
+import ast
+import os
+import subprocess
+import sys
+
+# Seconds, measured cold in a new process
+BUDGETS = {
+    "maof_logic": 0.15,       # headless pricing engine alone - numpy only
+    "maof_strategies": 0.05,
+    "maof_data": 0.15,        # requests / yfinance load on first fetch
+    "tase_data": 0.5,         # pandas; curl_cffi loads on first fetch
+    "app": 1.5,               # everything main.py imports before the first widget
+}
+
+APP_ENTRY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+def app_modules(path=APP_ENTRY):
+    """Modules main.py imports at top level, in order - read from its source, so the list never goes stale."""
+    with open(path, encoding="utf-8") as f: tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import): names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0: names = [node.module]
+        else: continue
+        modules += [name for name in names if name not in modules]
+    return modules
+
+RUNS = 3
+
+def measure(modules):
+    code = ("import time; t = time.perf_counter(); "
+            + "; ".join(f"import {m}" for m in modules)
+            + "; print(time.perf_counter() - t)")
+    best = float('inf')
+    for _ in range(RUNS):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=os.path.dirname(APP_ENTRY))
+        best = min(best, float(out.stdout.strip().splitlines()[-1]))
+    return best
+
+def main():
+    failed = False
+    for target, budget in BUDGETS.items():
+        modules = app_modules() if target == "app" else [target]
+        elapsed = measure(modules)
+        status = "OK" if elapsed <= budget else "OVER"
+        if elapsed > budget: failed = True
+        print(f"{target:<16} {elapsed:6.3f}s / {budget:.2f}s  {status}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
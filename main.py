@@ -2,16 +2,27 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from datetime import date, time, datetime, timedelta
+from datetime import date, datetime, timedelta
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
-import matplotlib.colors as mcolors
-import calendar
-import uuid
+import hashlib
+import math
+from time import perf_counter
 
 # --- IMPORTS FROM MODULES ---
 import maof_logic as logic
 import maof_strategies as strategies
-import maof_data as data
+import maof_charts as charts
+import maof_shared as shared
+import maof_portfolios as portfolios
+import maof_book as book
+import maof_live as live
+import maof_hedge as hedge
+import maof_calendar as tase_calendar
+import maof_sources as sources
+import maof_probability as probability
+import maof_surface as surface
+import maof_metrics as metrics
+import maof_explain as explain
 
 # --- Page Config ---
 st.set_page_config(layout="wide", page_title="DOR - Derivatives Operation Room")
@@ -86,54 +97,20 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Helpers ---
-def get_last_friday_of_month(year, month):
-    last_day = calendar.monthrange(year, month)[1]
-    target_date = date(year, month, last_day)
-    while target_date.weekday() != 4: 
-        target_date -= timedelta(days=1)
-    return target_date
-
-def get_default_expiry():
-    today = date.today()
-    this_month_expiry = get_last_friday_of_month(today.year, today.month)
-    if today > this_month_expiry:
-        next_month = today.month + 1 if today.month < 12 else 1
-        next_year = today.year if today.month < 12 else today.year + 1
-        return get_last_friday_of_month(next_year, next_month)
-    return this_month_expiry
-
-def get_color_gradient(c1, c2, n):
-    rgb1 = np.array(mcolors.to_rgb(c1))
-    rgb2 = np.array(mcolors.to_rgb(c2))
-    colors = []
-    for i in range(n):
-        t = i / (n - 1) if n > 1 else 0
-        rgb = (1 - t) * rgb1 + t * rgb2
-        colors.append(mcolors.to_hex(rgb))
-    return colors
-
-# --- PnL Explicit Calculation (Fix for 2D Graph) ---
-def calculate_explicit_pnl(df, spot, t, r, vol, mult):
-    """Calculates PnL by explicitly subtracting the initial cost from the theoretical value."""
-    total_pnl = 0.0
-    if df.empty: return 0.0
-    
-    for _, row in df.iterrows():
-        try:
-            # Current Theoretical Price
-            p, _, _, _, _ = logic.bs_calc_raw(spot, float(row['Strike']), t, r, vol, row['Type'])
-            theor_price = p * mult
-            
-            # Initial Cost (from DataFrame)
-            entry_price = float(row['Option Price'])
-            qty = float(row['Qty'])
-            
-            # PnL = (Value - Cost) * Qty
-            leg_pnl = (theor_price - entry_price) * qty
-            total_pnl += leg_pnl
-        except:
-            pass
-    return total_pnl
+# Trading days, sessions, expiries and every T come from the calendar's precomputed tables
+tcal = tase_calendar.get_calendar()
+
+def default_session_times():
+    """Today's session (or the next one): (open, close) + the gap to the following open as DD:HH:MM."""
+    d = date.today()
+    while tcal.session(d) is None: d += timedelta(days=1)
+    t_open, t_close = tcal.session(d)
+    return t_open, t_close, format_hours_to_string(tcal.overnight_gap_hours(d))
+
+def fmt_curr(val):
+    if val == float('inf'): return "INF"
+    if val == float('-inf'): return "-INF"
+    return f"{val:,.0f}"
 
 # --- Gap Parsing Logic (DD:HH:MM) ---
 def parse_gap_string(gap_str):
@@ -155,7 +132,7 @@ def parse_gap_string(gap_str):
 
 def format_hours_to_string(total_hours):
     try:
-        total_seconds = int(total_hours * 3600)
+        total_seconds = int(round(total_hours * 3600))
         days = total_seconds // 86400
         rem = total_seconds % 86400
         hours = rem // 3600
@@ -170,6 +147,8 @@ DEFAULT_MULT = 50
 DEFAULT_INTERVAL = 10
 DEFAULT_VOL = 0.14
 DEFAULT_RATE = 0.0425 
+CHAIN_WINDOW = 40          # chain rows sent to the grid at a time
+ANIM_MAX_FRAMES = 60       # time steps precomputed for the IV animation
 
 # PRE-INIT SPOT
 if 'spot_price_val' not in st.session_state: 
@@ -180,7 +159,7 @@ elif st.session_state['spot_price_val'] <= 0:
 if 'mode' not in st.session_state: st.session_state['mode'] = "Standard (Days)"
 if 'annual_days' not in st.session_state: st.session_state['annual_days'] = 365 
 
-if 'expiry_date_val' not in st.session_state: st.session_state['expiry_date_val'] = get_default_expiry()
+if 'expiry_date_val' not in st.session_state: st.session_state['expiry_date_val'] = tcal.default_expiry()
 if 'days_to_expiry_val' not in st.session_state:
     delta = st.session_state['expiry_date_val'] - date.today()
     st.session_state['days_to_expiry_val'] = max(0, delta.days)
@@ -189,15 +168,14 @@ if 'vol_input' not in st.session_state: st.session_state['vol_input'] = DEFAULT_
 if 'rate_input' not in st.session_state: st.session_state['rate_input'] = DEFAULT_RATE * 100
 
 # Intraday State
-if 'current_time' not in st.session_state: st.session_state['current_time'] = time(10, 0)
-if 'close_time' not in st.session_state: st.session_state['close_time'] = time(17, 40)
-if 'gap_str' not in st.session_state: st.session_state['gap_str'] = "00:16:20"
+if 'current_time' not in st.session_state:
+    st.session_state['current_time'], st.session_state['close_time'], st.session_state['gap_str'] = default_session_times()
 
 # Calc Helper State
 if 'calc_d1' not in st.session_state: st.session_state['calc_d1'] = date.today()
-if 'calc_t1' not in st.session_state: st.session_state['calc_t1'] = time(17, 40)
+if 'calc_t1' not in st.session_state: st.session_state['calc_t1'] = st.session_state['close_time']
 if 'calc_d2' not in st.session_state: st.session_state['calc_d2'] = date.today() + timedelta(days=1)
-if 'calc_t2' not in st.session_state: st.session_state['calc_t2'] = time(10, 0)
+if 'calc_t2' not in st.session_state: st.session_state['calc_t2'] = st.session_state['current_time']
 
 if 'portfolio_a' not in st.session_state:
     st.session_state['portfolio_a'] = pd.DataFrame(columns=["Type", "Strike", "Qty", "Option Price"])
@@ -212,6 +190,19 @@ def on_date_change():
 def on_days_change():
     st.session_state['expiry_date_val'] = date.today() + timedelta(days=st.session_state['days_to_expiry_val'])
 
+def on_expiry_pick():
+    st.session_state['expiry_date_val'] = st.session_state['expiry_pick']
+    on_date_change()
+
+def time_to_expiry(days=None, progress=0.0):
+    """T from the active time model - `days` (Standard) or `progress` through the session (Intraday) may be arrays."""
+    basis = st.session_state.get('annual_days', 365)
+    if st.session_state['mode'] == "Standard (Days)":
+        if days is None: days = st.session_state['days_to_expiry_val']
+        return tcal.year_fraction_days(days, basis)
+    gap_hours = parse_gap_string(st.session_state['gap_str'])
+    return tcal.year_fraction_intraday(st.session_state['current_time'], st.session_state['close_time'], gap_hours, basis, progress)
+
 def apply_gap_callback():
     dt1 = datetime.combine(st.session_state['calc_d1'], st.session_state['calc_t1'])
     dt2 = datetime.combine(st.session_state['calc_d2'], st.session_state['calc_t2'])
@@ -222,9 +213,7 @@ def apply_gap_callback():
 
 def on_mode_change():
     if st.session_state['mode_radio'] == "Intraday (0DTE)":
-        st.session_state['current_time'] = time(10, 0)
-        st.session_state['close_time'] = time(17, 40)
-        st.session_state['gap_str'] = "00:16:20"
+        st.session_state['current_time'], st.session_state['close_time'], st.session_state['gap_str'] = default_session_times()
     st.session_state['mode'] = st.session_state['mode_radio']
 
 # --- Top Header & Mode Switch ---
@@ -249,6 +238,7 @@ cols = st.columns([1, 1.2, 1, 1, 1, 3], gap="small")
 with cols[0]:
     st.markdown("##### 📍 Spot")
     ui_spot = st.number_input("Spot", key='spot_price_val', step=1.0, format="%.2f", label_visibility="collapsed")
+    st.toggle("📡 Live", key='live_mode', help=f"Poll the market every {live.LIVE_INTERVAL:.0f}s and refresh the chain and risk summary in place")
 
 # 2. Time Controls
 with cols[1]:
@@ -256,7 +246,9 @@ with cols[1]:
         st.markdown("##### ⏳ Expiry")
         st.date_input("Date", key='expiry_date_val', min_value=date.today(), on_change=on_date_change, label_visibility="collapsed")
         st.number_input("Days", key='days_to_expiry_val', min_value=0, step=1, on_change=on_days_change, label_visibility="collapsed")
-        T_calc = st.session_state['days_to_expiry_val'] / float(st.session_state.get('annual_days', 365))
+        expiries = tcal.upcoming_expiries()
+        st.selectbox("Expiries", [d for d, _ in expiries], index=None, key='expiry_pick', on_change=on_expiry_pick, placeholder="TASE expiries", label_visibility="collapsed",
+                     format_func=lambda d: f"{d:%a %d/%m} - {dict(expiries)[d]}")
         
     else: # Intraday Mode
         st.markdown("##### ⏱️ Intraday")
@@ -272,16 +264,6 @@ with cols[1]:
             st.button("Apply Gap", on_click=apply_gap_callback)
 
         st.text_input("Gap (DD:HH:MM)", key='gap_str')
-        gap_hours = parse_gap_string(st.session_state['gap_str'])
-
-        dt_now = datetime.combine(date.today(), t_now)
-        dt_close = datetime.combine(date.today(), t_close)
-        if dt_now > dt_close: minutes_remaining = 0
-        else: minutes_remaining = (dt_close - dt_now).total_seconds() / 60.0
-        
-        total_hours = (minutes_remaining / 60.0) + gap_hours
-        annual_hours = float(st.session_state.get('annual_days', 365)) * 24.0
-        T_calc = total_hours / annual_hours
 
 # 3. Market Data
 with cols[2]:
@@ -292,7 +274,7 @@ with cols[2]:
 # 4. Model Config
 with cols[3]:
     st.markdown("##### 📐 Model")
-    st.selectbox("Days/Year", [365, 252], key='annual_days', label_visibility="collapsed")
+    st.selectbox("Days/Year", [365, 252], key='annual_days', label_visibility="collapsed", help="365: calendar days. 252: TASE trading days (holidays excluded)")
 
 # 5. Contract Specs
 with cols[4]:
@@ -306,110 +288,175 @@ calculation_spot = ui_spot if (ui_spot is not None and ui_spot > 0) else DEFAULT
 
 vol = st.session_state['vol_input'] / 100
 r = st.session_state['rate_input'] / 100
-T = max(0.00001, T_calc)
+T = time_to_expiry()
+
+# --- SHARED COMPUTE (server-wide) ---
+@st.cache_resource
+def get_market_store():
+    """One chain / price cache per market state, shared by every session on this server."""
+    return shared.SharedMarketStore()
+
+store = get_market_store()
+
+@st.cache_resource
+def get_metrics_server():
+    """Local Prometheus endpoint (feed latency, fallbacks, pricing timings) - one per server process."""
+    return metrics.start_server()
+
+metrics_server = get_metrics_server()
+
+# --- LIVE MODE ---
+# One feed per server (polls only while someone is subscribed); each session consumes its own
+# bounded queue. Chain, risk summary and status are timer fragments - a tick never reruns the page.
+@st.cache_resource
+def get_live_feed(source_name):
+    return live.MarketFeed(live.make_source(source_name)).start()
+
+live_on = st.session_state.get('live_mode', False)
+live_every = live.LIVE_INTERVAL if live_on else None
+consumer = None
+if live_on:
+    feed = get_live_feed(live.FEED_SOURCE)
+    consumer = st.session_state.get('live_consumer')
+    if consumer is None or consumer.feed is not feed:
+        consumer = st.session_state['live_consumer'] = live.LiveConsumer(feed)
+elif 'live_consumer' in st.session_state:
+    st.session_state.pop('live_consumer').close()
+
+def set_spot(price):
+    st.session_state['spot_price_val'] = round(price, 2)
+
+@st.fragment(run_every=live_every)
+def render_live_status(calculation_spot):
+    tick = consumer.poll()
+    if tick is None:
+        st.caption(f"Waiting for {live.FEED_SOURCE.lower()} feed...")
+        return
+    age = datetime.now().timestamp() - tick.ts
+    move = tick.price - calculation_spot
+    st.caption(f"**{tick.price:,.2f}** ({move:+,.2f}) · {tick.source} · {age:.0f}s ago")
+    if st.button("⬇️ Use Live Spot", key="live_apply", on_click=set_spot, args=(tick.price,), use_container_width=True):
+        st.rerun()
+
+if live_on:
+    with cols[0]: render_live_status(calculation_spot)
 
 # --- 1. OPTIONS CHAIN ---
-st.divider()
-with st.expander("📊 Options Chain", expanded=True):
-    center = round(calculation_spot / strike_interval) * strike_interval
-    strikes = [center + (i - num_strikes//2)*strike_interval for i in range(num_strikes + 1)]
-    chain_rows = []
-    
-    for K in strikes:
-        try:
-            c_p, c_d, c_g, c_t, c_v = logic.bs_calc_raw(calculation_spot, K, T, r, vol, 'call')
-            p_p, p_d, p_g, p_t, p_v = logic.bs_calc_raw(calculation_spot, K, T, r, vol, 'put')
-            
-            chain_rows.append({
-                'C_Vega': int(c_v * multiplier), 'C_Theta': int(c_t * multiplier), 
-                'C_Gamma': round(c_g * 100, 2), 'C_Delta': int(c_d * 100), 'Call_Price': int(c_p * multiplier),
-                'Strike': int(K),
-                'Put_Price': int(p_p * multiplier), 'P_Delta': int(p_d * 100), 
-                'P_Gamma': round(p_g * 100, 2), 'P_Theta': int(p_t * multiplier), 'P_Vega': int(p_v * multiplier)
-            })
-        except:
-            chain_rows.append({'Strike': int(K), 'Call_Price': 0, 'Put_Price': 0})
-
-    df_chain = pd.DataFrame(chain_rows)
-    gb = GridOptionsBuilder.from_dataframe(df_chain)
-    gb.configure_default_column(resizable=True, filterable=False, sortable=False, suppressMenu=True, headerClass='center-header')
+@st.fragment(run_every=live_every)
+def render_options_chain(calculation_spot, T, r, vol, multiplier, strike_interval, num_strikes):
+    exp_chain = st.expander("📊 Options Chain", expanded=True, key="exp_chain", on_change="rerun")
+    with exp_chain:
+        if not exp_chain.open: return
+        chain_spot = calculation_spot
+        if consumer is not None:
+            consumer.poll()
+            chain_spot = consumer.spot(calculation_spot)
+
+        # Windowed chain: only the rows in view are priced (in cached blocks) and sent to the grid
+        c_exp, c_win = st.columns([2, 3])
+        extra = c_exp.multiselect("Expiries", [d for d, _ in tcal.upcoming_expiries() if d != st.session_state['expiry_date_val']],
+                                  key="chain_expiries", placeholder="+ more expiries", format_func=lambda d: d.strftime("%d/%m/%Y"))
+        basis = st.session_state.get('annual_days', 365)
+        expiries = [(st.session_state['expiry_date_val'].strftime("%d/%m"), T)] + \
+                   [(d.strftime("%d/%m"), tcal.year_fraction_days((d - date.today()).days, basis)) for d in sorted(extra)]
+        total = (int(num_strikes) + 1) * len(expiries)
+        start = 0
+        if total > CHAIN_WINDOW:
+            start = c_win.slider("Rows", 0, total - CHAIN_WINDOW, value=max(0, (int(num_strikes) + 1 - CHAIN_WINDOW) // 2), step=1, key="chain_start",
+                                 help=f"First row of the {CHAIN_WINDOW}-row window (ATM sits mid-range of each expiry)")
+        # Live ticks are priced on the session's own store; the shared one only sees the static market
+        chains = consumer.chain_window if consumer is not None else store.get_chain_window
+        df_chain, total = chains(chain_spot, expiries, r, vol, multiplier, strike_interval, num_strikes, start, CHAIN_WINDOW)
+        gb = GridOptionsBuilder.from_dataframe(df_chain)
+        gb.configure_default_column(resizable=True, filterable=False, sortable=False, suppressMenu=True, headerClass='center-header')
     
-    if not df_chain.empty:
-        for col in ['C_Vega', 'C_Theta', 'C_Gamma', 'C_Delta', 'Call_Price']: 
-            if col in df_chain.columns: gb.configure_column(col, width=90, cellStyle={'background-color': '#e6f2ff', 'text-align': 'center'})
-        for col in ['Put_Price', 'P_Delta', 'P_Gamma', 'P_Theta', 'P_Vega']: 
-            if col in df_chain.columns: gb.configure_column(col, width=90, cellStyle={'background-color': '#ffe6e6', 'text-align': 'center'})
-        if "Strike" in df_chain.columns:
-            gb.configure_column("Strike", pinned="right", width=100, cellStyle={'background-color': '#e0e0e0', 'font-weight': 'bold', 'text-align': 'center'})
+        if not df_chain.empty:
+            for col in ['C_Vega', 'C_Theta', 'C_Gamma', 'C_Delta', 'Call_Price']: 
+                if col in df_chain.columns: gb.configure_column(col, width=90, cellStyle={'background-color': '#e6f2ff', 'text-align': 'center'})
+            for col in ['Put_Price', 'P_Delta', 'P_Gamma', 'P_Theta', 'P_Vega']: 
+                if col in df_chain.columns: gb.configure_column(col, width=90, cellStyle={'background-color': '#ffe6e6', 'text-align': 'center'})
+            if "Strike" in df_chain.columns:
+                gb.configure_column("Strike", pinned="right", width=100, cellStyle={'background-color': '#e0e0e0', 'font-weight': 'bold', 'text-align': 'center'})
+            if "Expiry" in df_chain.columns:
+                gb.configure_column("Expiry", pinned="right", width=80, cellStyle={'background-color': '#e0e0e0', 'text-align': 'center'})
     
-    gridOptions = gb.build()
-    gridOptions['rowHeight'] = 30
-    gridOptions['headerHeight'] = 35
-    gridOptions['enableRtl'] = False 
+        gridOptions = gb.build()
+        gridOptions['rowHeight'] = 30
+        gridOptions['headerHeight'] = 35
+        gridOptions['enableRtl'] = False 
     
-    AgGrid(df_chain, gridOptions=gridOptions, height=300, theme='balham', key='chain_grid_main')
+        AgGrid(df_chain, gridOptions=gridOptions, height=300, theme='balham', key='chain_grid_main')
+        if total > CHAIN_WINDOW: st.caption(f"Rows {start + 1:,}-{start + len(df_chain):,} of {total:,}")
 
-# --- 2. STRATEGY WIZARD ---
 st.divider()
-with st.expander("🪄 Strategy Wizard", expanded=True):
-    c_tgt, _ = st.columns([1, 4])
-    with c_tgt:
-        target_portfolio = st.radio("Target:", ["A", "B"], horizontal=True)
+render_options_chain(calculation_spot, T, r, vol, multiplier, strike_interval, num_strikes)
+
+# --- 2. STRATEGY WIZARD ---
+@st.fragment
+def render_strategy_wizard(calculation_spot, T, r, vol, multiplier, strike_interval):
+    exp_wizard = st.expander("🪄 Strategy Wizard", expanded=True, key="exp_wizard", on_change="rerun")
+    with exp_wizard:
+        if not exp_wizard.open: return
+        c_tgt, _ = st.columns([1, 4])
+        with c_tgt:
+            target_portfolio = st.radio("Target:", ["A", "B"], horizontal=True)
     
-    def render_cell(container, strat_list, key_suffix):
-        with container:
-            st.markdown(f"<div class='strategy-card'>", unsafe_allow_html=True)
-            sel = st.selectbox("", strat_list, key=f"sel_{key_suffix}", label_visibility="collapsed")
-            if st.button("Load", key=f"btn_{key_suffix}", use_container_width=True):
-                legs = strategies.generate_strategy_legs(sel, calculation_spot, strike_interval)
-                rows = []
-                for leg in legs:
-                    p, _, _, _, _ = logic.bs_calc_raw(calculation_spot, leg['Strike'], T, r, vol, leg['Type'])
-                    price = int(p * multiplier)
-                    rows.append({"Type": leg['Type'], "Strike": leg['Strike'], "Qty": leg['Qty'], "Option Price": price})
+        def render_cell(container, strat_list, key_suffix):
+            with container:
+                st.markdown(f"<div class='strategy-card'>", unsafe_allow_html=True)
+                sel = st.selectbox("", strat_list, key=f"sel_{key_suffix}", label_visibility="collapsed")
+                if st.button("Load", key=f"btn_{key_suffix}", use_container_width=True):
+                    legs = strategies.generate_strategy_legs(sel, calculation_spot, strike_interval)
+                    rows = []
+                    for leg in legs:
+                        price = int(store.get_option_price(calculation_spot, T, r, vol, multiplier, leg['Type'], leg['Strike']))
+                        rows.append({"Type": leg['Type'], "Strike": leg['Strike'], "Qty": leg['Qty'], "Option Price": price})
                 
-                new_df = pd.DataFrame(rows)
-                target_key = "portfolio_a" if target_portfolio == "A" else "portfolio_b"
-                refresh_key = f"refresh_key_{target_portfolio}"
-                st.session_state[target_key] = new_df
-                if refresh_key not in st.session_state: st.session_state[refresh_key] = 0
-                st.session_state[refresh_key] += 1
-                st.toast(f"Loaded '{sel}'", icon="🪄")
-                st.rerun()
-            st.markdown("</div>", unsafe_allow_html=True)
-
-    c1, c2, c3 = st.columns(3, gap="small")
-    with c1:
-        st.markdown("<div class='bull-header'>🐂 Bullish (Low IV)</div>", unsafe_allow_html=True)
-        render_cell(c1, strategies.STRATEGY_MATRIX["Bullish"]["Low IV"], "bull_low")
-    with c2:
-        st.markdown("<div class='bull-header'>🐂 Bullish (Med IV)</div>", unsafe_allow_html=True)
-        render_cell(c2, strategies.STRATEGY_MATRIX["Bullish"]["Medium IV"], "bull_med")
-    with c3:
-        st.markdown("<div class='bull-header'>🐂 Bullish (High IV)</div>", unsafe_allow_html=True)
-        render_cell(c3, strategies.STRATEGY_MATRIX["Bullish"]["High IV"], "bull_high")
+                    new_df = pd.DataFrame(rows)
+                    target_key = "portfolio_a" if target_portfolio == "A" else "portfolio_b"
+                    refresh_key = f"refresh_key_{target_portfolio}"
+                    st.session_state[target_key] = new_df
+                    if refresh_key not in st.session_state: st.session_state[refresh_key] = 0
+                    st.session_state[refresh_key] += 1
+                    st.toast(f"Loaded '{sel}'", icon="🪄")
+                    st.rerun()
+                st.markdown("</div>", unsafe_allow_html=True)
+
+        c1, c2, c3 = st.columns(3, gap="small")
+        with c1:
+            st.markdown("<div class='bull-header'>🐂 Bullish (Low IV)</div>", unsafe_allow_html=True)
+            render_cell(c1, strategies.STRATEGY_MATRIX["Bullish"]["Low IV"], "bull_low")
+        with c2:
+            st.markdown("<div class='bull-header'>🐂 Bullish (Med IV)</div>", unsafe_allow_html=True)
+            render_cell(c2, strategies.STRATEGY_MATRIX["Bullish"]["Medium IV"], "bull_med")
+        with c3:
+            st.markdown("<div class='bull-header'>🐂 Bullish (High IV)</div>", unsafe_allow_html=True)
+            render_cell(c3, strategies.STRATEGY_MATRIX["Bullish"]["High IV"], "bull_high")
         
-    c4, c5, c6 = st.columns(3, gap="small")
-    with c4:
-        st.markdown("<div class='neutral-header'>😐 Neutral (Low IV)</div>", unsafe_allow_html=True)
-        render_cell(c4, strategies.STRATEGY_MATRIX["Neutral"]["Low IV"], "neut_low")
-    with c5:
-        st.markdown("<div class='neutral-header'>😐 Neutral (Med IV)</div>", unsafe_allow_html=True)
-        render_cell(c5, strategies.STRATEGY_MATRIX["Neutral"]["Medium IV"], "neut_med")
-    with c6:
-        st.markdown("<div class='neutral-header'>😐 Neutral (High IV)</div>", unsafe_allow_html=True)
-        render_cell(c6, strategies.STRATEGY_MATRIX["Neutral"]["High IV"], "neut_high")
-
-    c7, c8, c9 = st.columns(3, gap="small")
-    with c7:
-        st.markdown("<div class='bear-header'>🐻 Bearish (Low IV)</div>", unsafe_allow_html=True)
-        render_cell(c7, strategies.STRATEGY_MATRIX["Bearish"]["Low IV"], "bear_low")
-    with c8:
-        st.markdown("<div class='bear-header'>🐻 Bearish (Med IV)</div>", unsafe_allow_html=True)
-        render_cell(c8, strategies.STRATEGY_MATRIX["Bearish"]["Medium IV"], "bear_med")
-    with c9:
-        st.markdown("<div class='bear-header'>🐻 Bearish (High IV)</div>", unsafe_allow_html=True)
-        render_cell(c9, strategies.STRATEGY_MATRIX["Bearish"]["High IV"], "bear_high")
+        c4, c5, c6 = st.columns(3, gap="small")
+        with c4:
+            st.markdown("<div class='neutral-header'>😐 Neutral (Low IV)</div>", unsafe_allow_html=True)
+            render_cell(c4, strategies.STRATEGY_MATRIX["Neutral"]["Low IV"], "neut_low")
+        with c5:
+            st.markdown("<div class='neutral-header'>😐 Neutral (Med IV)</div>", unsafe_allow_html=True)
+            render_cell(c5, strategies.STRATEGY_MATRIX["Neutral"]["Medium IV"], "neut_med")
+        with c6:
+            st.markdown("<div class='neutral-header'>😐 Neutral (High IV)</div>", unsafe_allow_html=True)
+            render_cell(c6, strategies.STRATEGY_MATRIX["Neutral"]["High IV"], "neut_high")
+
+        c7, c8, c9 = st.columns(3, gap="small")
+        with c7:
+            st.markdown("<div class='bear-header'>🐻 Bearish (Low IV)</div>", unsafe_allow_html=True)
+            render_cell(c7, strategies.STRATEGY_MATRIX["Bearish"]["Low IV"], "bear_low")
+        with c8:
+            st.markdown("<div class='bear-header'>🐻 Bearish (Med IV)</div>", unsafe_allow_html=True)
+            render_cell(c8, strategies.STRATEGY_MATRIX["Bearish"]["Medium IV"], "bear_med")
+        with c9:
+            st.markdown("<div class='bear-header'>🐻 Bearish (High IV)</div>", unsafe_allow_html=True)
+            render_cell(c9, strategies.STRATEGY_MATRIX["Bearish"]["High IV"], "bear_high")
+
+st.divider()
+render_strategy_wizard(calculation_spot, T, r, vol, multiplier, strike_interval)
 
 # --- 3. PORTFOLIO MANAGEMENT ---
 st.divider()
@@ -424,6 +471,19 @@ function(params) {
 }
 """)
 
+# Saved-book lists feed the editors and the book view on every rerun - read once per store change
+@st.cache_data(ttl=60, show_spinner=False)
+def saved_tags():
+    return portfolios.list_tags()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def saved_portfolios(tag=None):
+    return portfolios.list_portfolios(tag=tag)
+
+def saved_changed():
+    saved_tags.clear()
+    saved_portfolios.clear()
+
 def render_portfolio_editor(key, df_key, color_hex):
     if f"refresh_key_{key}" not in st.session_state: st.session_state[f"refresh_key_{key}"] = 0
     if 'Option Price' not in st.session_state[df_key].columns:
@@ -436,7 +496,9 @@ def render_portfolio_editor(key, df_key, color_hex):
     calc_btn = c2.button(f"🧮 Calc BS", key=f"calc_{key}", use_container_width=True)
     clear_btn = c3.button(f"🗑️ Clear", key=f"clr_{key}", use_container_width=True)
 
-    if add_btn:
+    if add_btn and len(st.session_state[df_key]) >= shared.MAX_PORTFOLIO_LEGS:
+        st.warning(f"Portfolio {key} is limited to {shared.MAX_PORTFOLIO_LEGS} legs")
+    elif add_btn:
         new_row = pd.DataFrame([{"Type": "Call", "Strike": 0, "Qty": 0, "Option Price": 0}])
         st.session_state[df_key] = pd.concat([st.session_state[df_key], new_row], ignore_index=True)
         st.session_state[f"refresh_key_{key}"] += 1
@@ -446,8 +508,8 @@ def render_portfolio_editor(key, df_key, color_hex):
         st.session_state[f"refresh_key_{key}"] += 1
         st.rerun()
 
-    display_df = st.session_state[df_key].copy()
-    if 'Total Cost' not in display_df.columns: display_df['Total Cost'] = display_df['Qty'] * display_df['Option Price']
+    # No per-rerun copy: 'Total Cost' is a grid-only column (JS valueGetter)
+    display_df = st.session_state[df_key]
 
     gb_p = GridOptionsBuilder.from_dataframe(display_df)
     gb_p.configure_default_column(editable=True, resizable=True, suppressMenu=True)
@@ -468,19 +530,16 @@ def render_portfolio_editor(key, df_key, color_hex):
     
     res_df = response['data']
     if not res_df.empty:
-        res_df['Strike'] = res_df['Strike'].astype(int)
-        res_df['Qty'] = res_df['Qty'].astype(int)
-        res_df['Option Price'] = res_df['Option Price'].astype(int)
+        res_df = shared.compact_portfolio(res_df.head(shared.MAX_PORTFOLIO_LEGS))
         res_df['Total Cost'] = res_df['Qty'] * res_df['Option Price'] 
-        st.session_state[df_key] = res_df.drop(columns=['Total Cost']) if 'Total Cost' in res_df.columns else res_df
+        st.session_state[df_key] = res_df.drop(columns=['Total Cost'])
 
     if calc_btn:
-        df = st.session_state[df_key]
+        df = st.session_state[df_key].copy()   # the grid above was built from the stored frame
         if not df.empty:
             for index, row in df.iterrows():
                 try:
-                    p, _, _, _, _ = logic.bs_calc_raw(calculation_spot, float(row['Strike']), T, r, vol, row['Type'])
-                    df.at[index, 'Option Price'] = int(p * multiplier)
+                    df.at[index, 'Option Price'] = int(store.get_option_price(calculation_spot, T, r, vol, multiplier, row['Type'], row['Strike']))
                 except: pass
             st.session_state[df_key] = df
             st.session_state[f"refresh_key_{key}"] += 1
@@ -489,6 +548,29 @@ def render_portfolio_editor(key, df_key, color_hex):
     
     total_cost = res_df['Total Cost'].sum() if not res_df.empty else 0
     st.metric(f"Total Cost {key}", f"{total_cost:,.0f}")
+
+    # Local store: save the current legs / load a saved book into this editor
+    with st.expander("💾 Save / Load"):
+        c_name, c_tags = st.columns(2)
+        save_name = c_name.text_input("Name", key=f"save_name_{key}")
+        save_tags = c_tags.text_input("Tags", key=f"save_tags_{key}", placeholder="comma, separated")
+        if st.button("💾 Save", key=f"save_{key}", use_container_width=True):
+            try:
+                portfolios.save_portfolio(save_name, st.session_state[df_key], tags=save_tags)
+                saved_changed()
+                st.toast(f"Saved '{save_name}'", icon="💾")
+            except Exception as e:
+                st.error(f"Save failed: {e}")
+
+        c_tag, c_sel = st.columns(2)
+        tag_filter = c_tag.selectbox("Tag", ["All"] + saved_tags(), key=f"load_tag_{key}")
+        saved = saved_portfolios(tag=None if tag_filter == "All" else tag_filter)
+        load_name = c_sel.selectbox("Saved", saved['Name'].tolist(), key=f"load_sel_{key}")
+        if st.button("📂 Load", key=f"load_{key}", use_container_width=True, disabled=load_name is None):
+            st.session_state[df_key] = shared.compact_portfolio(portfolios.load_portfolio(load_name))
+            st.session_state[f"refresh_key_{key}"] += 1
+            st.toast(f"Loaded '{load_name}'", icon="📂")
+            st.rerun()
     return res_df
 
 col_a, col_b = st.columns(2)
@@ -496,28 +578,36 @@ with col_a: df_a = render_portfolio_editor("A", "portfolio_a", "#e6f2ff")
 with col_b: df_b = render_portfolio_editor("B", "portfolio_b", "#ffe6e6")
 
 # --- 4. RISK SUMMARY ---
-if not df_a.empty or not df_b.empty:
-    st.divider()
-    st.subheader("⚖️ Risk Summary")
-    
-    greeks_a = logic.calculate_portfolio_greeks(df_a, calculation_spot, T, r, vol, multiplier)
-    greeks_b = logic.calculate_portfolio_greeks(df_b, calculation_spot, T, r, vol, multiplier)
-    
-    def fmt_curr(val):
-        if val == float('inf'): return "INF"
-        if val == float('-inf'): return "-INF"
-        return f"{val:,.0f}"
+@st.fragment(run_every=live_every)
+def render_risk_summary(df_a, df_b, calculation_spot, T, r, vol, multiplier):
+    if consumer is not None:
+        consumer.poll()
+        live_spot = consumer.spot(calculation_spot)
+        greeks_a, greeks_b = consumer.portfolio_greeks([df_a, df_b], live_spot, T, r, vol, multiplier)
+        st.caption(f"📡 Live @ {live_spot:,.2f}")
+    else:
+        greeks_a, greeks_b = logic.calculate_portfolios_greeks([df_a, df_b], calculation_spot, T, r, vol, multiplier)
+        live_spot = calculation_spot
 
+    # Expiry odds in closed form (lognormal, segment by segment) for both portfolios at once
+    prob = probability.probability_analytics([df_a, df_b], live_spot, T, r, vol, multiplier)
+    def odds_rows(i):
+        levels, touch = prob['Breakevens'][i], prob['TouchProb'][i]
+        return [f"{prob['POP'][i]:.1%}", fmt_curr(prob['ExpectedPnL'][i]),
+                " / ".join(f"{lv:,.0f}" for lv in levels) or "-",
+                " / ".join(f"{p:.0%}" for p in touch) or "-"]
+    
     df_risk = pd.DataFrame({
-        'Metric': ['Total Cost (Exposure)', 'Total P&L (Current)', 'Max Profit', 'Max Loss', 'Delta', 'Gamma', 'Theta', 'Vega'],
+        'Metric': ['Total Cost (Exposure)', 'Total P&L (Current)', 'Max Profit', 'Max Loss', 'Delta', 'Gamma', 'Theta', 'Vega',
+                   'Prob. of Profit', 'Expected P&L (Expiry)', 'Breakevens', 'Touch Prob.'],
         'Port_A': [
             fmt_curr(greeks_a['Cost']), fmt_curr(greeks_a['PnL']), fmt_curr(greeks_a['MaxProfit']), fmt_curr(greeks_a['MaxLoss']),
             f"{greeks_a['Delta']:,.0f}", f"{greeks_a['Gamma']:,.2f}", fmt_curr(greeks_a['Theta']), fmt_curr(greeks_a['Vega'])
-        ],
+        ] + odds_rows(0),
         'Port_B': [
             fmt_curr(greeks_b['Cost']), fmt_curr(greeks_b['PnL']), fmt_curr(greeks_b['MaxProfit']), fmt_curr(greeks_b['MaxLoss']),
             f"{greeks_b['Delta']:,.0f}", f"{greeks_b['Gamma']:,.2f}", fmt_curr(greeks_b['Theta']), fmt_curr(greeks_b['Vega'])
-        ]
+        ] + odds_rows(1)
     })
     
     gb_risk = GridOptionsBuilder.from_dataframe(df_risk)
@@ -528,114 +618,126 @@ if not df_a.empty or not df_b.empty:
     
     gridOptions_risk = gb_risk.build()
     gridOptions_risk['enableRtl'] = False 
-    risk_key = str(uuid.uuid4())
-    AgGrid(df_risk, gridOptions=gridOptions_risk, height=300, fit_columns_on_grid_load=True, allow_unsafe_jscode=True, theme='balham', key=risk_key)
+    # Stable key: the grid remounts only when the table content changes
+    risk_key = "risk_grid_" + hashlib.md5(df_risk.to_json().encode()).hexdigest()[:12]
+    AgGrid(df_risk, gridOptions=gridOptions_risk, height=400, fit_columns_on_grid_load=True, allow_unsafe_jscode=True, theme='balham', key=risk_key)
 
-    st.divider()
-    
-    # --- 5. GRAPHS & ANALYSIS ---
-    col_main_controls, _ = st.columns([1, 2])
-    with col_main_controls:
-        st.markdown("##### ⚙️ Graph Settings")
-        chart_range_pct = st.number_input("Zoom (+/-%)", min_value=0.5, max_value=15.0, value=5.0, step=0.5, format="%.1f")
-        lower_bound = calculation_spot * (1 - chart_range_pct / 100)
-        upper_bound = calculation_spot * (1 + chart_range_pct / 100)
-        spot_range = np.linspace(lower_bound, upper_bound, 80)
-        
-    # --- GRAPH 1: TIME ANALYSIS ---
-    with st.container():
+# --- 5. GRAPHS & ANALYSIS ---
+# Each graph is its own fragment: its controls rerun only that graph, and a collapsed graph computes nothing.
+# --- GRAPH 1: TIME ANALYSIS ---
+@st.fragment
+def render_time_analysis(df_a, df_b, spot_range, calculation_spot, r, vol, multiplier):
+    exp_time = st.expander("⏱️ Time Analysis", expanded=True, key="exp_time", on_change="rerun")
+    with exp_time:
+        if not exp_time.open: return
         st.markdown('<div class="simulation-box">', unsafe_allow_html=True)
         col_g1, col_c1 = st.columns([5, 1], gap="medium")
         with col_c1:
-            st.markdown("**⏱️ Time Analysis**")
             num_slices = st.number_input("Time Lines", 1, 10, 5)
             comp_mode_time = st.radio("Mode:", ["Separate", "Diff"], key="mode_time")
+            show_ladder = st.toggle("Greeks Ladder", value=True, key="ladder_on")
+            if show_ladder:
+                ladder_greek = st.radio("Greek:", ["Delta", "Gamma", "Theta", "Vega"], key="ladder_greek")
+                ladder_slices = st.checkbox("All time lines", value=False, key="ladder_slices")
             if st.session_state['mode'] == "Standard (Days)":
                 st.info("Lines = Days passing")
             else:
                 st.info("Lines = Hours remaining today")
-            
+        
         with col_g1:
+            col_pnl, col_ladder = st.columns(2) if show_ladder else (st.container(), None)
             fig_time = go.Figure()
             time_fractions = np.linspace(0, 1, num_slices)
-            blues = get_color_gradient('#87CEFA', '#000080', num_slices)
-            reds = get_color_gradient('#FFA07A', '#8B0000', num_slices)
-            greens = get_color_gradient('#90EE90', '#006400', num_slices)
-            
-            for i, frac in enumerate(time_fractions):
-                # Logic split based on mode
-                if st.session_state['mode'] == "Standard (Days)":
-                    total_days = st.session_state['days_to_expiry_val']
-                    denom = float(st.session_state.get('annual_days', 365))
-                    t_new = (total_days * (1 - frac)) / denom
-                    if t_new < 0.00001: t_new = 0.00001
-                    d_pass = frac * total_days
-                    lbl = f"{d_pass:.1f}d" if frac > 0 else "Now"
-                
-                else: # Intraday
-                    dt_now = datetime.combine(date.today(), st.session_state['current_time'])
-                    dt_close = datetime.combine(date.today(), st.session_state['close_time'])
-                    if dt_now >= dt_close: mins_total = 0
-                    else: mins_total = (dt_close - dt_now).total_seconds() / 60.0
-                    
-                    mins_remaining = mins_total * (1 - frac)
-                    
-                    gap_hours = parse_gap_string(st.session_state['gap_str'])
-                    t_hours = (mins_remaining / 60.0) + gap_hours
-                    annual_hours = float(st.session_state.get('annual_days', 365)) * 24.0
-                    t_new = t_hours / annual_hours
-                    
-                    if frac == 0: lbl = "Now"
-                    elif frac == 1: lbl = "Close"
-                    else: 
-                        mins_passed = mins_total * frac
-                        future_dt = dt_now + timedelta(minutes=mins_passed)
-                        lbl = future_dt.strftime("%H:%M")
-
-                width = 3 if (frac==0 or frac==1) else 1.5
-                dash = 'solid' if (frac==0 or frac==1) else 'dot'
-                
-                pnl_a = np.array([logic.calculate_portfolio_pnl(df_a, s, t_new, r, vol, multiplier, False) for s in spot_range]) if not df_a.empty else np.zeros_like(spot_range)
-                pnl_b = np.array([logic.calculate_portfolio_pnl(df_b, s, t_new, r, vol, multiplier, False) for s in spot_range]) if not df_b.empty else np.zeros_like(spot_range)
-                
-                if comp_mode_time == "Separate":
-                    if not df_a.empty: fig_time.add_trace(go.Scatter(x=spot_range, y=pnl_a, mode='lines', name=f"A: {lbl}", line=dict(color=blues[i], width=width, dash=dash), hovertemplate=f"<b>A: {lbl}</b><br>Spot: %{{x:,.0f}}<br>P&L: %{{y:,.0f}}<extra></extra>"))
-                    if not df_b.empty: fig_time.add_trace(go.Scatter(x=spot_range, y=pnl_b, mode='lines', name=f"B: {lbl}", line=dict(color=reds[i], width=width, dash=dash), hovertemplate=f"<b>B: {lbl}</b><br>Spot: %{{x:,.0f}}<br>P&L: %{{y:,.0f}}<extra></extra>"))
-                else:
-                    fig_time.add_trace(go.Scatter(x=spot_range, y=pnl_a-pnl_b, mode='lines', name=f"Diff: {lbl}", line=dict(color=greens[i], width=width, dash=dash), hovertemplate=f"<b>Diff: {lbl}</b><br>Spot: %{{x:,.0f}}<br>Diff: %{{y:,.0f}}<extra></extra>"))
+
+            # All slices' T in one lookup; labels are the only per-slice work
+            if st.session_state['mode'] == "Standard (Days)":
+                total_days = st.session_state['days_to_expiry_val']
+                t_values = time_to_expiry(days=total_days * (1 - time_fractions))
+                labels = ["Now" if frac == 0 else f"{frac * total_days:.1f}d" for frac in time_fractions]
+            else: # Intraday
+                t_values = time_to_expiry(progress=time_fractions)
+                dt_now = datetime.combine(date.today(), st.session_state['current_time'])
+                dt_close = datetime.combine(date.today(), st.session_state['close_time'])
+                mins_total = max(0.0, (dt_close - dt_now).total_seconds() / 60.0)
+                labels = ["Now" if frac == 0 else "Close" if frac == 1 else (dt_now + timedelta(minutes=mins_total * frac)).strftime("%H:%M")
+                          for frac in time_fractions]
+
+            # One pass for both portfolios: (portfolio, time slice, spot) - P&L and greeks from the same d1/d2
+            ladder = logic.portfolios_greeks_grid([df_a, df_b], spot_range[None, :], t_values[:, None], r, vol, multiplier)
+            curves_a, curves_b = ladder['PnL']
+            labels = np.array(labels)
+
+            # Merged WebGL families: solid edges (Now / Close) + dotted inner slices
+            is_edge = (time_fractions == 0) | (time_fractions == 1)
+            if comp_mode_time == "Separate":
+                families = []
+                if not df_a.empty: families.append(("A", curves_a, ('#87CEFA', '#000080')))
+                if not df_b.empty: families.append(("B", curves_b, ('#FFA07A', '#8B0000')))
+            else:
+                families = [("Diff", curves_a - curves_b, ('#90EE90', '#006400'))]
+
+            for name, curves, color_range in families:
+                value_title = "Diff" if name == "Diff" else "P&L"
+                for sel, width, dash, show in [(is_edge, 3, 'solid', True), (~is_edge, 1.5, 'dot', False)]:
+                    charts.add_line_family(fig_time, spot_range, curves[sel], labels[sel], name, color_range, width=width, dash=dash, value_title=value_title, showlegend=show)
 
             fig_time.add_vline(x=calculation_spot, line_dash="dash", line_color="gray")
             fig_time.add_hline(y=0, line_color="black")
             fig_time.update_layout(title="PnL vs Time Decay", margin=dict(l=10, r=10, t=30, b=10), height=350, hovermode="closest", hoverlabel=dict(bgcolor="rgba(255,255,255,0)", bordercolor="rgba(255,255,255,0)"))
-            st.plotly_chart(fig_time, use_container_width=True)
+            col_pnl.plotly_chart(fig_time, use_container_width=True)
+
+            # Greeks ladder: the chosen greek across the zoom range, at Now or on every time line
+            if show_ladder:
+                fig_ladder = go.Figure()
+                greek_a, greek_b = ladder[ladder_greek]
+                rows = np.ones(len(time_fractions), dtype=bool) if ladder_slices else time_fractions == 0
+                if comp_mode_time == "Separate":
+                    families = []
+                    if not df_a.empty: families.append(("A", greek_a, ('#87CEFA', '#000080')))
+                    if not df_b.empty: families.append(("B", greek_b, ('#FFA07A', '#8B0000')))
+                else:
+                    families = [("Diff", greek_a - greek_b, ('#90EE90', '#006400'))]
+                for name, curves, color_range in families:
+                    for sel, width, dash, show in [(rows & is_edge, 3, 'solid', True), (rows & ~is_edge, 1.5, 'dot', False)]:
+                        if sel.any():
+                            charts.add_line_family(fig_ladder, spot_range, curves[sel], labels[sel], name, color_range, width=width, dash=dash, value_title=ladder_greek, showlegend=show,
+                                                    value_fmt=",.2f" if ladder_greek == "Gamma" else ",.0f")
+                fig_ladder.add_vline(x=calculation_spot, line_dash="dash", line_color="gray")
+                fig_ladder.add_hline(y=0, line_color="black")
+                fig_ladder.update_layout(title=f"{ladder_greek} vs Spot", margin=dict(l=10, r=10, t=30, b=10), height=350, hovermode="closest", hoverlabel=dict(bgcolor="rgba(255,255,255,0)", bordercolor="rgba(255,255,255,0)"))
+                col_ladder.plotly_chart(fig_ladder, use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
 
-    # --- GRAPH 2: IV SCENARIO ANALYSIS ---
-    with st.container():
+# --- GRAPH 2: IV SCENARIO ANALYSIS ---
+@st.fragment
+def render_iv_analysis(df_a, df_b, spot_range, calculation_spot, r, vol, multiplier):
+    exp_iv = st.expander("⚡ IV Analysis", expanded=True, key="exp_iv", on_change="rerun")
+    with exp_iv:
+        if not exp_iv.open: return
         st.markdown('<div class="simulation-box">', unsafe_allow_html=True)
         col_g2, col_c2 = st.columns([5, 1], gap="medium")
         with col_c2:
-            st.markdown("**⚡ IV Analysis**")
-            # Dynamic Slider based on Mode
-            if st.session_state['mode'] == "Standard (Days)":
-                sim_step = st.slider("Sim Day", 0, st.session_state['days_to_expiry_val'], 0)
-                denom = float(st.session_state.get('annual_days', 365))
-                t_sim = (st.session_state['days_to_expiry_val'] - sim_step) / denom
+            # Animate: every time step precomputed and scrubbed in the browser; otherwise one step per rerun
+            animate = st.toggle("▶️ Animate", value=False, key="iv_animate", help="Precompute all time steps - the chart slider runs client-side")
+            standard = st.session_state['mode'] == "Standard (Days)"
+            total_days = st.session_state['days_to_expiry_val']
+            if animate:
+                if standard:
+                    steps = np.unique(np.linspace(0, total_days, min(total_days, ANIM_MAX_FRAMES) + 1).round().astype(int))
+                    t_sim = time_to_expiry(days=total_days - steps)
+                    step_labels, step_prefix = [f"{d}" for d in steps], "Sim Day: "
+                else:
+                    steps = np.linspace(0, 100, 21)
+                    t_sim = time_to_expiry(progress=steps / 100.0)
+                    step_labels, step_prefix = [f"{p:.0f}%" for p in steps], "Day Progress: "
+                t_sim = np.atleast_1d(t_sim)
+            elif standard:
+                sim_step = st.slider("Sim Day", 0, total_days, 0)
+                t_sim = np.atleast_1d(time_to_expiry(days=total_days - sim_step))
             else:
                 # Intraday: Slider represents % of trading day passed
                 sim_step_pct = st.slider("Day Progress %", 0, 100, 0)
-                
-                dt_now = datetime.combine(date.today(), st.session_state['current_time'])
-                dt_close = datetime.combine(date.today(), st.session_state['close_time'])
-                if dt_now >= dt_close: mins_total = 0
-                else: mins_total = (dt_close - dt_now).total_seconds() / 60.0
-                
-                mins_remaining = mins_total * (1 - (sim_step_pct/100.0))
-                
-                gap_hours = parse_gap_string(st.session_state['gap_str'])
-                t_hours = (mins_remaining / 60.0) + gap_hours
-                annual_hours = float(st.session_state.get('annual_days', 365)) * 24.0
-                t_sim = t_hours / annual_hours
+                t_sim = np.atleast_1d(time_to_expiry(progress=sim_step_pct / 100.0))
 
             min_iv_u = st.number_input("Min IV", value=8.0, step=1.0)
             max_iv_u = st.number_input("Max IV", value=40.0, step=1.0)
@@ -645,106 +747,352 @@ if not df_a.empty or not df_b.empty:
 
         with col_g2:
             fig_iv = go.Figure()
-            if t_sim < 0.00001: t_sim = 0.00001
-            
+        
             iv_levels = np.linspace(min_iv_u/100.0, max_iv_u/100.0, iv_n)
-            blues_iv = get_color_gradient('#ADD8E6', '#00008B', iv_n) 
-            reds_iv = get_color_gradient('#FFA07A', '#8B0000', iv_n)
-            greens_iv = get_color_gradient('#90EE90', '#006400', iv_n)
-            
-            for i, sim_vol in enumerate(iv_levels):
-                width = 1.5
-                dash = 'dash'
-                # Use Explicit PnL function for IV Graph
-                pnl_a_iv = np.array([calculate_explicit_pnl(df_a, s, t_sim, r, sim_vol, multiplier) for s in spot_range]) if not df_a.empty else np.zeros_like(spot_range)
-                pnl_b_iv = np.array([calculate_explicit_pnl(df_b, s, t_sim, r, sim_vol, multiplier) for s in spot_range]) if not df_b.empty else np.zeros_like(spot_range)
-                lbl_vol = f"IV {sim_vol*100:.1f}%"
-                
+        
+            # One pass for both portfolios: (portfolio, time step, IV level, spot) - last IV row is the current market IV (solid)
+            vol_rows = np.append(iv_levels, vol)
+            pnl_cube = logic.portfolios_pnl_grid([df_a, df_b], spot_range[None, None, :], t_sim[:, None, None], r, vol_rows[None, :, None], multiplier)
+
+            def step_families(k):
+                curves_a_iv, curves_b_iv = pnl_cube[:, k, :-1]
+                pnl_a_curr, pnl_b_curr = pnl_cube[:, k, -1]
                 if comp_mode_iv == "Separate":
-                    if not df_a.empty: fig_iv.add_trace(go.Scatter(x=spot_range, y=pnl_a_iv, mode='lines', name=f"A: {lbl_vol}", line=dict(color=blues_iv[i], width=width, dash=dash), hovertemplate=f"<b>A: {lbl_vol}</b><br>Spot: %{{x:,.0f}}<br>P&L: %{{y:,.0f}}<extra></extra>"))
-                    if not df_b.empty: fig_iv.add_trace(go.Scatter(x=spot_range, y=pnl_b_iv, mode='lines', name=f"B: {lbl_vol}", line=dict(color=reds_iv[i], width=width, dash=dash), hovertemplate=f"<b>B: {lbl_vol}</b><br>Spot: %{{x:,.0f}}<br>P&L: %{{y:,.0f}}<extra></extra>"))
-                else:
-                    fig_iv.add_trace(go.Scatter(x=spot_range, y=pnl_a_iv-pnl_b_iv, mode='lines', name=f"Diff: {lbl_vol}", line=dict(color=greens_iv[i], width=width, dash=dash), hovertemplate=f"<b>Diff: {lbl_vol}</b><br>Spot: %{{x:,.0f}}<br>Diff: %{{y:,.0f}}<extra></extra>"))
-
-            # Current Market IV (Solid) - Using standard func or explicit? Let's use explicit for consistency in this graph
-            pnl_a_curr = np.array([calculate_explicit_pnl(df_a, s, t_sim, r, vol, multiplier) for s in spot_range]) if not df_a.empty else np.zeros_like(spot_range)
-            pnl_b_curr = np.array([calculate_explicit_pnl(df_b, s, t_sim, r, vol, multiplier) for s in spot_range]) if not df_b.empty else np.zeros_like(spot_range)
-            
-            if comp_mode_iv == "Separate":
-                if not df_a.empty: fig_iv.add_trace(go.Scatter(x=spot_range, y=pnl_a_curr, mode='lines', name=f"A: Market ({vol*100:.1f}%)", line=dict(color='blue', width=3, dash='solid'), hovertemplate=f"<b>A: Market</b><br>Spot: %{{x:,.0f}}<br>P&L: %{{y:,.0f}}<extra></extra>"))
-                if not df_b.empty: fig_iv.add_trace(go.Scatter(x=spot_range, y=pnl_b_curr, mode='lines', name=f"B: Market ({vol*100:.1f}%)", line=dict(color='red', width=3, dash='solid'), hovertemplate=f"<b>B: Market</b><br>Spot: %{{x:,.0f}}<br>P&L: %{{y:,.0f}}<extra></extra>"))
-            else:
-                fig_iv.add_trace(go.Scatter(x=spot_range, y=pnl_a_curr-pnl_b_curr, mode='lines', name=f"Diff: Market", line=dict(color='green', width=3, dash='solid'), hovertemplate=f"<b>Diff: Market</b><br>Spot: %{{x:,.0f}}<br>Diff: %{{y:,.0f}}<extra></extra>"))
+                    families = []
+                    if not df_a.empty: families.append(("A", curves_a_iv, pnl_a_curr, ('#ADD8E6', '#00008B'), 'blue'))
+                    if not df_b.empty: families.append(("B", curves_b_iv, pnl_b_curr, ('#FFA07A', '#8B0000'), 'red'))
+                    return families
+                return [("Diff", curves_a_iv - curves_b_iv, pnl_a_curr - pnl_b_curr, ('#90EE90', '#006400'), 'green')]
+
+            iv_labels = iv_levels * 100
+            for name, curves, curr, color_range, market_color in step_families(0):
+                value_title = "Diff" if name == "Diff" else "P&L"
+                charts.add_line_family(fig_iv, spot_range, curves, iv_labels, name, color_range, label_fmt="IV %{customdata:.1f}%", dash='dash', value_title=value_title)
+                charts.add_line_family(fig_iv, spot_range, [curr], [vol * 100], f"{name}: Market ({vol*100:.1f}%)", (market_color, market_color), label_fmt="IV %{customdata:.1f}%", width=3, value_title=value_title)
 
             fig_iv.add_vline(x=calculation_spot, line_dash="dash", line_color="gray")
             fig_iv.add_hline(y=0, line_color="black")
             fig_iv.update_layout(title=f"PnL vs IV Sensitivity", margin=dict(l=10, r=10, t=30, b=10), height=350, hovermode="closest", hoverlabel=dict(bgcolor="rgba(255,255,255,0)", bordercolor="rgba(255,255,255,0)"))
+            if animate:
+                # Frames resend only y: per step, the same traces in the same order as the base figure
+                frame_ys = [[y for _, curves, curr, _, _ in step_families(k) for y in charts.family_y(curves) + charts.family_y([curr])]
+                            for k in range(len(t_sim))]
+                shown = np.concatenate([np.concatenate(ys) for ys in frame_ys]) if frame_ys and frame_ys[0] else np.zeros(1)
+                lo, hi = np.nanmin(shown), np.nanmax(shown)
+                pad = (hi - lo) * 0.05 or 1.0
+                charts.add_frames(fig_iv, frame_ys, step_labels, prefix=step_prefix, y_range=[lo - pad, hi + pad])
+                fig_iv.update_layout(height=450, margin=dict(l=10, r=10, t=30, b=10))
             st.plotly_chart(fig_iv, use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
 
-    # --- GRAPH 3: 3D SURFACE ---
-    with st.container():
-        col_3d_title, col_3d_sel = st.columns([2, 1])
-        with col_3d_title: st.subheader("🎲 3D Surface")
+# --- GRAPH 3: 3D SURFACE ---
+@st.fragment
+def render_surface(df_a, df_b, spot_range, T, r, vol, multiplier):
+    exp_3d = st.expander("🎲 3D Surface", expanded=True, key="exp_3d", on_change="rerun")
+    with exp_3d:
+        if not exp_3d.open: return
+        _, col_3d_sel = st.columns([2, 1])
         with col_3d_sel: 
             surface_type = st.radio("Axis:", ["Spot vs Time", "Spot vs Volatility"], horizontal=True)
             view_mode = st.radio("3D Mode:", ["Diff (A - B)", "Portfolio A", "Portfolio B"], horizontal=True)
+            c_res, c_budget = st.columns(2)
+            resolution = c_res.select_slider("Resolution", [50, 100, 200, 300, surface.MAX_RESOLUTION], value=100, key="surf_res")
+            budget = c_budget.number_input("Budget (s)", 0.5, 30.0, surface.TIME_BUDGET, 0.5, key="surf_budget")
 
-        if surface_type == "Spot vs Time":
-            y_data = np.linspace(0, st.session_state['days_to_expiry_val'], 25)
+        # Target grid: resolution x resolution over the zoomed spot range
+        n_y = n_x = resolution
+        x_data = np.linspace(spot_range[0], spot_range[-1], n_x)
+        intraday = st.session_state['mode'] != "Standard (Days)"
+        if surface_type == "Spot vs Time" and intraday:
+            y_data = np.linspace(0, 100, n_y)
+            y_title = 'Day Progress %'
+            y_fmt = '.0f'
+            tick_fmt = None
+        elif surface_type == "Spot vs Time":
+            y_data = np.linspace(0, st.session_state['days_to_expiry_val'], n_y)
             y_title = 'Days Passed'
             y_fmt = '.1f'
             tick_fmt = None
         else:
-            y_data = np.linspace(vol * 0.5, vol * 1.5, 25)
+            y_data = np.linspace(vol * 0.5, vol * 1.5, n_y)
             y_title = 'Volatility'
             y_fmt = '.1%' # Hover format
             tick_fmt = '.0%' # Axis tick format
 
-        X, Y = np.meshgrid(spot_range, y_data)
-        Z = np.zeros_like(X)
         colorscale = 'RdYlGn'
         z_title = "Diff"
         chart_title = "Advantage A vs B"
         if "Portfolio A" in view_mode: colorscale, z_title, chart_title = 'RdBu', "P&L A", "Portfolio A"
         elif "Portfolio B" in view_mode: colorscale, z_title, chart_title = 'RdBu', "P&L B", "Portfolio B"
 
-        # 3D Calculation Loop - Robust
-        denom_3d = float(st.session_state.get('annual_days', 365))
-        
-        for i in range(len(y_data)):
-            if surface_type == "Spot vs Time":
-                d_passed = y_data[i]
-                v_calc = vol
-                if st.session_state['mode'] == "Standard (Days)":
-                    t_new = (st.session_state['days_to_expiry_val'] - d_passed) / denom_3d
-                else:
-                    t_new = ((24 - d_passed) / 24.0) / denom_3d
-            else:
-                v_calc = y_data[i]
-                t_new = T
-
-            if t_new < 0.00001: t_new = 0.00001
-            
-            for j in range(len(spot_range)):
-                s_new = spot_range[j]
-                val_a = logic.calculate_portfolio_pnl(df_a, s_new, t_new, r, v_calc, multiplier, False)
-                val_b = logic.calculate_portfolio_pnl(df_b, s_new, t_new, r, v_calc, multiplier, False)
-                
-                res = 0
-                if "Diff" in view_mode: res = val_a - val_b
-                elif "Portfolio A" in view_mode: res = val_a
-                elif "Portfolio B" in view_mode: res = val_b
-                
-                if np.isnan(res): res = 0
-                Z[i, j] = res
+        # 3D Grid - coarse preview first, then tiles refined on the worker pool and drawn as they land
+        if surface_type == "Spot vs Time":
+            t_axis = time_to_expiry(progress=y_data / 100.0) if intraday else time_to_expiry(days=st.session_state['days_to_expiry_val'] - y_data)
+            v_axis = np.full(n_y, vol)
+        else:
+            t_axis, v_axis = np.full(n_y, T), y_data
+        book_ab = logic.build_contract_matrix([df_a, df_b])
+
+        def evaluate(rows, cols):
+            val_a, val_b = logic.portfolios_pnl_grid(None, x_data[cols][None, :], t_axis[rows][:, None], r, v_axis[rows][:, None], multiplier, book=book_ab)
+            if "Diff" in view_mode: return np.nan_to_num(val_a - val_b)
+            return np.nan_to_num(val_a if "Portfolio A" in view_mode else val_b)
 
-        fig_3d = go.Figure(data=[go.Surface(z=Z, x=spot_range, y=y_data, colorscale=colorscale, cmid=0, opacity=0.9, hovertemplate=f"Spot: %{{x:,.0f}}<br>{y_title}: %{{y:{y_fmt}}}<br>{z_title}: %{{z:,.0f}}<extra></extra>", contours_z=dict(show=False), contours_x=dict(highlight=False), contours_y=dict(highlight=False), showscale=True, colorbar=dict(title="PnL"))])
-        
         # Dynamic Axis Formatting
         yaxis_dict = dict(showgrid=True, title=y_title)
         if tick_fmt:
             yaxis_dict['tickformat'] = tick_fmt
-            
-        fig_3d.update_layout(title=chart_title, scene=dict(xaxis_title='Spot', yaxis_title=y_title, zaxis_title='P&L', xaxis=dict(showgrid=True), yaxis=yaxis_dict, zaxis=dict(showgrid=True)), margin=dict(l=0, r=0, b=0, t=30), height=400, hovermode="closest", hoverlabel=dict(bgcolor="rgba(255,255,255,0)", bordercolor="rgba(255,255,255,0)"))
-        st.plotly_chart(fig_3d, use_container_width=True)
\ No newline at end of file
+
+        # A changed figure is a new chart element to Streamlit (its id hashes the spec; a key may appear once
+        # per run), so every redraw starts from the default camera: tiles stream in at REDRAW_INTERVAL, and
+        # the finished surface is drawn once under a stable key
+        chart_slot, status_slot = st.empty(), st.empty()
+        last_draw, draws = 0.0, 0
+        for Z, done, total in surface.progressive_surface(evaluate, n_y, n_x, budget=budget):
+            final = done == total
+            if not final and done and perf_counter() - last_draw < surface.REDRAW_INTERVAL: continue
+            fig_3d = go.Figure(data=[go.Surface(z=Z, x=x_data, y=y_data, colorscale=colorscale, cmid=0, opacity=0.9, hovertemplate=f"Spot: %{{x:,.0f}}<br>{y_title}: %{{y:{y_fmt}}}<br>{z_title}: %{{z:,.0f}}<extra></extra>", contours_z=dict(show=False), contours_x=dict(highlight=False), contours_y=dict(highlight=False), showscale=True, colorbar=dict(title="PnL"))])
+            fig_3d.update_layout(title=chart_title, scene=dict(xaxis_title='Spot', yaxis_title=y_title, zaxis_title='P&L', xaxis=dict(showgrid=True), yaxis=yaxis_dict, zaxis=dict(showgrid=True)), margin=dict(l=0, r=0, b=0, t=30), height=400, hovermode="closest", hoverlabel=dict(bgcolor="rgba(255,255,255,0)", bordercolor="rgba(255,255,255,0)"))
+            chart_slot.plotly_chart(fig_3d, use_container_width=True, key="surface" if final else f"surface_{draws}")
+            status_slot.caption(f"{n_x}×{n_y} · refining {done}/{total} tiles…")
+            last_draw, draws = perf_counter(), draws + 1
+        if not final:   # budget hit: the last tiles may have been throttled
+            fig_3d.data[0].z = Z
+            chart_slot.plotly_chart(fig_3d, use_container_width=True, key="surface")
+        status_slot.caption(f"{n_x}×{n_y} · {done}/{total} tiles" + ("" if done == total else f" · time budget ({budget:.1f}s) reached, rest is the coarse estimate"))
+
+@st.fragment
+def render_analysis(df_a, df_b, calculation_spot, T, r, vol, multiplier):
+    """Graph settings are upstream of all three graphs, so Zoom reruns this fragment only."""
+    col_main_controls, _ = st.columns([1, 2])
+    with col_main_controls:
+        st.markdown("##### ⚙️ Graph Settings")
+        chart_range_pct = st.number_input("Zoom (+/-%)", min_value=0.5, max_value=15.0, value=5.0, step=0.5, format="%.1f")
+        lower_bound = calculation_spot * (1 - chart_range_pct / 100)
+        upper_bound = calculation_spot * (1 + chart_range_pct / 100)
+        spot_range = np.linspace(lower_bound, upper_bound, 80)
+
+    render_time_analysis(df_a, df_b, spot_range, calculation_spot, r, vol, multiplier)
+    render_iv_analysis(df_a, df_b, spot_range, calculation_spot, r, vol, multiplier)
+    render_surface(df_a, df_b, spot_range, T, r, vol, multiplier)
+
+if not df_a.empty or not df_b.empty:
+    st.divider()
+    st.subheader("⚖️ Risk Summary")
+    render_risk_summary(df_a, df_b, calculation_spot, T, r, vol, multiplier)
+    st.divider()
+    render_analysis(df_a, df_b, calculation_spot, T, r, vol, multiplier)
+
+# --- 6. BOOK AGGREGATION ---
+@st.fragment
+def render_book(df_a, df_b, calculation_spot, T, r, vol, multiplier):
+    exp_book = st.expander("📚 Book Aggregation", expanded=False, key="exp_book", on_change="rerun")
+    with exp_book:
+        if not exp_book.open: return
+        c_names, c_tag, c_ab = st.columns([3, 1, 1])
+        tag = c_tag.selectbox("Tag", ["All"] + saved_tags(), key="book_tag")
+        tag = None if tag == "All" else tag
+        saved = saved_portfolios(tag=tag)
+        names = c_names.multiselect("Portfolios", saved['Name'].tolist(), key="book_names", placeholder="All saved portfolios")
+        include_ab = c_ab.checkbox("Include A / B", value=True, key="book_ab")
+
+        # One query for every saved book + the two editors, netted by contract before pricing
+        df_legs = portfolios.load_portfolios(names=names or None, tag=tag)
+        if include_ab:
+            df_legs = pd.concat([book.stack_portfolios({"Editor A": df_a, "Editor B": df_b}), df_legs], ignore_index=True)
+        if df_legs.empty:
+            st.info("No legs in the selected book")
+            return
+
+        df_book = book.book_risk(df_legs, calculation_spot, T, r, vol, multiplier)
+        for col in ['Cost', 'PnL', 'Theta', 'Vega', 'MaxProfit', 'MaxLoss']: df_book[col] = df_book[col].map(fmt_curr)
+        df_book['Delta'] = df_book['Delta'].map(lambda v: f"{v:,.0f}")
+        df_book['Gamma'] = df_book['Gamma'].map(lambda v: f"{v:,.2f}")
+
+        c_book, c_net = st.columns([3, 2], gap="medium")
+        with c_book:
+            st.markdown(f"**Breakdown** - {len(df_book) - 1:,} portfolios, {len(df_legs):,} legs")
+            gb_book = GridOptionsBuilder.from_dataframe(df_book)
+            gb_book.configure_default_column(resizable=True, filterable=False, sortable=True, suppressMenu=True, headerClass='center-header', cellStyle={'text-align': 'center'})
+            gb_book.configure_column("Portfolio", pinned="left", width=150, cellStyle={'font-weight': 'bold', 'text-align': 'left'})
+            grid_book = gb_book.build()
+            grid_book['enableRtl'] = False
+            grid_book['pinnedBottomRowData'] = df_book.tail(1).to_dict('records')
+            AgGrid(df_book.iloc[:-1], gridOptions=grid_book, height=350, theme='balham', key="book_grid")
+
+        with c_net:
+            df_net = book.net_positions(df_legs)
+            st.markdown(f"**Net Positions** - {len(df_net):,} contracts")
+            gb_net = GridOptionsBuilder.from_dataframe(df_net)
+            gb_net.configure_default_column(resizable=True, filterable=False, sortable=True, suppressMenu=True, headerClass='center-header')
+            gb_net.configure_column("Total Cost", type=["numericColumn"], precision=0)
+            grid_net = gb_net.build()
+            grid_net['enableRtl'] = False
+            AgGrid(df_net, gridOptions=grid_net, height=350, theme='balham', key="book_net_grid")
+
+st.divider()
+render_book(df_a, df_b, calculation_spot, T, r, vol, multiplier)
+
+# --- 7. P&L EXPLAIN ---
+@st.fragment
+def render_explain(df_a, df_b, calculation_spot, T, r, vol, multiplier):
+    exp_explain = st.expander("🧮 P&L Explain", expanded=False, key="exp_explain", on_change="rerun")
+    with exp_explain:
+        if not exp_explain.open: return
+        now_spot = consumer.spot(calculation_spot) if consumer is not None else calculation_spot
+        current = explain.MarketState(now_spot, T, r, vol)
+
+        # Start = the snapshot (positions + greeks, priced once); without one, the current market
+        c_snap, c_spot, c_iv, c_time, c_rate = st.columns([1.3, 1, 1, 1, 1])
+        if c_snap.button("📸 Snapshot", use_container_width=True, help="Freeze A/B and their greeks at the current market"):
+            if not shared.store_result(st.session_state, 'explain_snapshot', explain.take_snapshot([df_a, df_b], current, multiplier, ["Portfolio A", "Portfolio B"])):
+                st.warning("Snapshot too large for this session's memory limit - explaining against the current market")
+        snapshot = st.session_state.get('explain_snapshot')
+        if snapshot is not None and c_snap.button("Clear", use_container_width=True):
+            del st.session_state['explain_snapshot']
+            snapshot = None
+        if snapshot is None: snapshot = explain.take_snapshot([df_a, df_b], current, multiplier, ["Portfolio A", "Portfolio B"])
+
+        # End = the current market shifted by the what-if inputs
+        spot_move = c_spot.number_input("Spot move %", -20.0, 20.0, 0.0, 0.25, key="explain_spot")
+        iv_move = c_iv.number_input("IV move (pts)", -20.0, 20.0, 0.0, 0.5, key="explain_iv")
+        if st.session_state['mode'] == "Standard (Days)":
+            days_passed = c_time.number_input("Days passed", 0, int(st.session_state['days_to_expiry_val']), 0, key="explain_days")
+            T_end = time_to_expiry(days=st.session_state['days_to_expiry_val'] - days_passed)
+        else:
+            progress = c_time.number_input("Day Progress %", 0, 100, 0, key="explain_progress")
+            T_end = time_to_expiry(progress=progress / 100.0)
+        rate_move = c_rate.number_input("Rate move (bp)", -200, 200, 0, 5, key="explain_rate")
+        end = explain.MarketState(current.spot * (1 + spot_move / 100), T_end, r + rate_move / 10000, max(vol + iv_move / 100, 0.001))
+
+        start = snapshot['state']
+        st.caption(f"Start: spot {start.spot:,.2f} · IV {start.vol:.1%} · T {start.T:.4f}"
+                   + (f" (snapshot {datetime.fromtimestamp(snapshot['taken_at']):%H:%M:%S})" if 'explain_snapshot' in st.session_state else " (current market)")
+                   + f"  →  End: spot {end.spot:,.2f} · IV {end.vol:.1%} · T {end.T:.4f}")
+
+        df_explain = explain.explain_pnl(snapshot, end)
+        cols = st.columns(len(df_explain))
+        for col, (name, row) in zip(cols, df_explain.iterrows()):
+            fig = go.Figure(go.Waterfall(
+                x=explain.TERMS + ['Residual', 'Total'], y=[row[t] for t in explain.TERMS] + [row['Residual'], row['Actual']],
+                measure=['relative'] * (len(explain.TERMS) + 1) + ['total'], connector=dict(line=dict(color="#bbbbbb")),
+                increasing=dict(marker=dict(color="#2e8b57")), decreasing=dict(marker=dict(color="#c0392b")), totals=dict(marker=dict(color="#34495e")),
+                hovertemplate="%{x}: %{y:,.0f}<extra></extra>"))
+            fig.update_layout(title=f"{name}: {fmt_curr(row['Actual'])}", margin=dict(l=10, r=10, t=30, b=10), height=300, showlegend=False)
+            col.plotly_chart(fig, use_container_width=True)
+
+        df_view = df_explain.reset_index(names="Portfolio")
+        for col in df_view.columns[1:]: df_view[col] = df_view[col].map(fmt_curr)
+        gb_explain = GridOptionsBuilder.from_dataframe(df_view)
+        gb_explain.configure_default_column(resizable=True, filterable=False, sortable=False, suppressMenu=True, headerClass='center-header', cellStyle={'text-align': 'center'})
+        gb_explain.configure_column("Portfolio", pinned="left", width=130, cellStyle={'font-weight': 'bold', 'text-align': 'left'})
+        grid_explain = gb_explain.build()
+        grid_explain['enableRtl'] = False
+        AgGrid(df_view, gridOptions=grid_explain, height=120, fit_columns_on_grid_load=True, theme='balham', key="explain_grid")
+
+st.divider()
+render_explain(df_a, df_b, calculation_spot, T, r, vol, multiplier)
+
+# --- 8. DELTA HEDGING SIMULATOR ---
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_price_history():
+    return sources.get_source().get_price_history()   # live, recorded or replayed like the quotes
+
+@st.fragment
+def render_hedging(df_a, df_b, calculation_spot, T, r, vol, multiplier):
+    exp_hedge = st.expander("🛡️ Delta Hedging Simulator", expanded=False, key="exp_hedge", on_change="rerun")
+    with exp_hedge:
+        if not exp_hedge.open: return
+        c1, c2, c3, c4, c5, c6 = st.columns([1, 1.2, 1, 1, 1, 2.5])
+        target = c1.radio("Portfolio", ["A", "B"], horizontal=True, key="hedge_target")
+        path_source = c2.radio("Paths", ["Simulated (GBM)", "Historical"], key="hedge_source")
+        n_paths = c3.number_input("Paths", min_value=1000, max_value=20000, value=10000, step=1000, key="hedge_paths")
+        realized_vol = c4.number_input("Realized IV (%)", min_value=1.0, max_value=150.0, value=float(round(vol * 100, 1)), step=0.5, key="hedge_rvol")
+        tc_bps = c5.number_input("Cost (bps)", min_value=0.0, max_value=50.0, value=1.0, step=0.5, key="hedge_tc")
+        schedules = c6.multiselect("Rebalance", list(hedge.FREQUENCIES), default=["Hourly", "Daily", "Weekly"], key="hedge_freq")
+
+        df_target = df_a if target == "A" else df_b
+        if st.button("▶️ Run Simulation", key="hedge_run", disabled=df_target.empty or not schedules):
+            # Horizon = trading time to expiry, one step per trading hour (the schedules count trading steps)
+            if st.session_state['mode'] == "Standard (Days)":
+                trading_days = float(tcal.trading_days_ahead(st.session_state['days_to_expiry_val']))
+            else:   # 0DTE: what is left of today's session (the settlement gap is not trading time)
+                trading_days = tcal.session_days_left(st.session_state['current_time'], st.session_state['close_time'])
+            n_steps = max(1, math.ceil(trading_days * hedge.STEPS_PER_DAY))
+            paths = None
+            if path_source == "Historical":
+                closes = get_price_history()
+                try: paths = hedge.bootstrap_paths(closes, calculation_spot, n_paths, n_steps) if closes is not None else None
+                except ValueError: paths = None
+                if paths is None: st.warning("Price history unavailable - using simulated paths")
+            if paths is None:
+                paths = hedge.gbm_paths(calculation_spot, T, realized_vol / 100, r, n_paths, n_steps)
+
+            frequencies = {k: hedge.FREQUENCIES[k] for k in schedules}
+            results = hedge.simulate_hedging(df_target, paths, T, r, vol, multiplier, frequencies=frequencies, tc_bps=tc_bps)
+            # Keep only what the view needs: the summary and a binned P&L distribution per schedule
+            edges = np.histogram_bin_edges(np.concatenate([res['Hedged'] for res in results.values()]), bins=60)
+            hists = {label: np.histogram(res['Hedged'], bins=edges)[0].astype(np.int32) for label, res in results.items()}
+            view = (target, len(paths), n_steps, hedge.summarize(results), edges.astype(np.float32), hists)
+            if not shared.store_result(st.session_state, 'hedge_view', view): st.warning("Result too large for this session's memory limit")
+
+        if 'hedge_view' not in st.session_state:
+            st.info("Pick a portfolio and schedules, then run")
+            return
+        view_target, view_paths, view_steps, df_summary, edges, hists = st.session_state['hedge_view']
+        st.markdown(f"**Portfolio {view_target}** - {view_paths:,} paths x {view_steps:,} steps, hedged with the underlying at model delta")
+
+        df_view = df_summary.copy()
+        for col in ['Mean P&L', 'Std P&L', 'P5', 'P95', 'Costs', 'Gamma P&L', 'Theta P&L', 'Scalp Net']: df_view[col] = df_view[col].map(fmt_curr)
+        gb_hedge = GridOptionsBuilder.from_dataframe(df_view)
+        gb_hedge.configure_default_column(resizable=True, filterable=False, sortable=False, suppressMenu=True, headerClass='center-header', cellStyle={'text-align': 'center'})
+        gb_hedge.configure_column("Schedule", pinned="left", width=120, cellStyle={'font-weight': 'bold', 'text-align': 'left'})
+        grid_hedge = gb_hedge.build()
+        grid_hedge['enableRtl'] = False
+        AgGrid(df_view, gridOptions=grid_hedge, height=230, fit_columns_on_grid_load=True, theme='balham', key="hedge_grid")
+
+        fig_hedge = go.Figure()
+        centers = (edges[:-1] + edges[1:]) / 2
+        for label, counts in hists.items():
+            dash = 'dot' if label == "Unhedged" else 'solid'
+            fig_hedge.add_trace(go.Scatter(x=centers, y=counts / counts.sum(), mode='lines', line_shape='hvh', line=dict(width=2, dash=dash), name=label,
+                                           hovertemplate=f"{label}<br>P&L: %{{x:,.0f}}<br>Share: %{{y:.1%}}<extra></extra>"))
+        fig_hedge.add_vline(x=0, line_color="black")
+        fig_hedge.update_layout(title="Hedged P&L Distribution (to expiry)", xaxis_title="P&L", yaxis_tickformat='.0%', margin=dict(l=10, r=10, t=30, b=10), height=350, hovermode="closest")
+        st.plotly_chart(fig_hedge, use_container_width=True)
+
+st.divider()
+render_hedging(df_a, df_b, calculation_spot, T, r, vol, multiplier)
+
+# --- 9. SIDEBAR: LIBRARY & RESOURCES ---
+with st.sidebar:
+    st.markdown("##### 🗄️ Portfolio Library")
+    st.caption("CSV columns: Portfolio, Type, Strike, Qty, Option Price, Tags")
+    uploaded_csv = st.file_uploader("Import CSV", type=["csv"], label_visibility="collapsed")
+    if uploaded_csv is not None and st.button("⬆️ Import", use_container_width=True):
+        try:
+            n_imported = portfolios.import_csv(uploaded_csv)
+            saved_changed()
+            st.toast(f"Imported {n_imported:,} portfolios", icon="🗄️")
+        except Exception as e:
+            st.error(f"Import failed: {e}")
+    # Deferred: the join + CSV run only when the button is clicked, not on every rerun
+    st.download_button("⬇️ Export All", portfolios.export_csv, file_name="dor_portfolios.csv", mime="text/csv", on_click="ignore", use_container_width=True)
+
+    st.markdown("##### 🖥️ Resources")
+    session_bytes, released = shared.enforce_session_limit(st.session_state)
+    st.caption(f"Session: {session_bytes / 1024:,.0f} KB of {shared.SESSION_MEMORY_LIMIT / (1024 * 1024):.0f} MB")
+    if released:
+        st.warning(f"Session over its memory limit - released: {', '.join(released)}")
+
+    store_stats = store.stats()
+    lookups = store_stats['Hits'] + store_stats['Misses']
+    hit_rate = store_stats['Hits'] / lookups if lookups else 0
+    st.caption(f"Shared: {store_stats['States']} market states, {store_stats['Blocks']} blocks, {store_stats['Prices']} prices ({store_stats['Bytes'] / 1024:,.0f} KB), hit rate {hit_rate:.0%}")
+    if metrics_server is not None:
+        host, port = metrics_server.server_address[:2]
+        fallbacks = sum(v for (name, _), v in metrics.snapshot().items() if name == 'dor_fallback_total')
+        st.caption(f"Metrics: http://{host}:{port}/metrics · {fallbacks:,.0f} feed fallbacks")
+    if live_on:
+        feed_stats = feed.stats()
+        st.caption(f"Live feed ({live.FEED_SOURCE}, data: {sources.DATA_MODE}): {feed_stats['Subscribers']} sessions, {feed_stats['Polls']:,} polls, {feed_stats['Failures']:,} failed, {feed_stats['Dropped']:,} stale ticks dropped")
\ No newline at end of file
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+import maof_logic as logic
+import maof_metrics as metrics
+
+# --- Book Aggregation ---
+# A book is one long leg table (Portfolio, Type, Strike, Qty, Option Price) covering any number
+# of sub-portfolios. Legs are netted by contract (Type, Strike) before pricing, so a desk book
+# costs as much as its distinct contracts, not its leg count.
+
+RISK_COLUMNS = ['Legs', 'Contracts', 'Cost', 'PnL', 'Delta', 'Gamma', 'Theta', 'Vega', 'MaxProfit', 'MaxLoss']
+BOOK_ROW = "Book (Net)"
+
+def stack_portfolios(portfolios):
+    """{name: DataFrame} -> one long leg table with a Portfolio column."""
+    frames = [df.assign(Portfolio=name) for name, df in portfolios.items() if df is not None and not df.empty]
+    if not frames: return pd.DataFrame(columns=["Portfolio", "Type", "Strike", "Qty", "Option Price"])
+    return pd.concat(frames, ignore_index=True)
+
+def net_positions(df_legs):
+    """
+    Nets all legs of a book by contract.
+    Option Price is the quantity-weighted entry (Total Cost / Qty); a flat contract keeps its realized Total Cost.
+    """
+    book = logic.build_book_matrix(df_legs)
+    net_qty = np.asarray(book['Q'].sum(axis=0)).ravel()
+    total_cost = book['contract_costs']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_price = np.where(net_qty != 0, total_cost / net_qty, 0.0)
+
+    return pd.DataFrame({
+        'Type': np.where(book['is_call'], 'Call', 'Put'),
+        'Strike': book['strike'].astype(int),
+        'Qty': net_qty.astype(int),
+        'Option Price': np.round(avg_price).astype(int),
+        'Total Cost': total_cost,
+    })
+
+@metrics.timed("book_risk")
+def book_risk(df_legs, spot, T, r, vol, multiplier):
+    """
+    Risk per sub-portfolio plus a netted book row - one contract matrix, each contract priced once.
+    """
+    from scipy.sparse import vstack, csr_matrix
+    book = logic.build_book_matrix(df_legs)
+
+    # Book row = column sums of Q (the netted position), priced with the same contracts
+    net_row = csr_matrix(book['Q'].sum(axis=0))
+    with_net = dict(book, Q=vstack([book['Q'], net_row]).tocsr(), costs=np.append(book['costs'], book['costs'].sum()))
+    totals = logic.calculate_portfolios_greeks(None, spot, T, r, vol, multiplier, book=with_net)
+
+    # Legs = rows entered, Contracts = distinct contracts with an open position - the same in every row
+    names = book['names'] + [BOOK_ROW]
+    legs = np.append(book['legs'], book['legs'].sum())
+    Q = with_net['Q'].copy()
+    Q.eliminate_zeros()   # legs that net out within a portfolio hold nothing
+    contracts = np.diff(Q.indptr)
+    rows = [{'Portfolio': name, 'Legs': int(n_legs), 'Contracts': int(n_contracts), **{k: float(t[k]) for k in RISK_COLUMNS[2:]}}
+            for name, n_legs, n_contracts, t in zip(names, legs, contracts, totals)]
+    return pd.DataFrame(rows, columns=['Portfolio'] + RISK_COLUMNS)
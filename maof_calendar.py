@@ -0,0 +1,155 @@
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+import numpy as np
+
+# --- TASE Trading Calendar & Time Model ---
+# One source for time to expiry. The calendar file gives sessions per weekday, holidays and the
+# expiry rules; the day tables (trading flag, session minutes, cumulative trading days) are built
+# once, so every chart / slider / surface gets its T array from a lookup instead of datetime loops.
+
+CALENDAR_PATH = os.environ.get("DOR_CALENDAR_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tase_calendar.json"))
+TRADING_BASIS = 252          # Days/Year = 252 counts trading days; any other basis counts calendar days
+TABLE_DAYS = 3 * 366
+MIN_T = 0.00001
+
+def _minutes(hhmm):
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+def _as_time(minutes):
+    return time(int(minutes) // 60, int(minutes) % 60)
+
+class TradingCalendar:
+    """Trading days, sessions and expiries, with day tables precomputed from `start`."""
+
+    def __init__(self, spec, start=None, n_days=TABLE_DAYS):
+        self.holidays = {date.fromisoformat(d): name for d, name in spec.get("holidays", {}).items()}
+        self.expiry_rules = spec.get("expiry", {})
+        sessions = {int(wd): (_minutes(o), _minutes(c)) for wd, (o, c) in spec.get("sessions", {}).items()}
+
+        self.start = start or date.today() - timedelta(days=7)
+        self.days = np.arange(np.datetime64(self.start, "D"), np.datetime64(self.start, "D") + n_days)
+        weekday = (self.days.astype(np.int64) + 3) % 7                      # 1970-01-01 was a Thursday; Monday = 0
+        open_by_wd = np.array([sessions.get(wd, (0, 0))[0] for wd in range(7)])
+        close_by_wd = np.array([sessions.get(wd, (0, 0))[1] for wd in range(7)])
+        holiday = np.isin(self.days, np.array(sorted(self.holidays), dtype="datetime64[D]"))
+
+        self.is_trading = (close_by_wd[weekday] > open_by_wd[weekday]) & ~holiday
+        self.open_min = np.where(self.is_trading, open_by_wd[weekday], 0)
+        self.close_min = np.where(self.is_trading, close_by_wd[weekday], 0)
+        self.cum_trading = np.concatenate([[0], np.cumsum(self.is_trading)])   # trading days before day i
+
+    # --- Lookups ---
+    def _index(self, d):
+        return int((np.datetime64(d, "D") - self.days[0]).astype(np.int64))
+
+    def is_trading_day(self, d):
+        i = self._index(d)
+        return bool(self.is_trading[i]) if 0 <= i < len(self.days) else d.weekday() < 5 and d not in self.holidays
+
+    def session(self, d):
+        """(open, close) times of d's session, or None if the exchange is closed."""
+        i = self._index(d)
+        if not (0 <= i < len(self.days)) or not self.is_trading[i]: return None
+        return _as_time(self.open_min[i]), _as_time(self.close_min[i])
+
+    def next_session(self, after):
+        """(open datetime) of the first session starting after the given datetime."""
+        d = after.date()
+        for _ in range(30):
+            s = self.session(d)
+            if s is not None and datetime.combine(d, s[0]) > after: return datetime.combine(d, s[0])
+            d += timedelta(days=1)
+        return None
+
+    def overnight_gap_hours(self, d):
+        """Hours from d's close (or the last session before it) to the next open."""
+        while self.session(d) is None: d -= timedelta(days=1)
+        close_dt = datetime.combine(d, self.session(d)[1])
+        next_open = self.next_session(close_dt)
+        return (next_open - close_dt).total_seconds() / 3600.0 if next_open else 0.0
+
+    def trading_days_ahead(self, days, today=None):
+        """Trading days in (today, today + days] - vectorized; fractional days interpolate the next day."""
+        last = len(self.cum_trading) - 1
+        i0 = min(max(self._index(today or date.today()) + 1, 0), last)
+        x = np.clip(i0 + np.asarray(days, dtype=float), 0, last)
+        return np.interp(x, np.arange(last + 1), self.cum_trading) - self.cum_trading[i0]
+
+    def session_days_left(self, now, close, d=None):
+        """Trading time from `now` to `close` in sessions of day d (today; the next session if closed) - the 0DTE clock."""
+        d = d or date.today()
+        for _ in range(30):
+            s = self.session(d)
+            if s is not None: break
+            d += timedelta(days=1)
+        else:
+            return 0.0
+        of_day = lambda t: t.hour * 60 + t.minute + t.second / 60
+        return max(0.0, (of_day(close) - of_day(now)) / (of_day(s[1]) - of_day(s[0])))
+
+    # --- Year Fractions (vectorized) ---
+    def year_fraction_days(self, days, basis=365, today=None):
+        """T for `days` calendar days from today: calendar days / basis, or trading days / 252."""
+        days = np.maximum(np.asarray(days, dtype=float), 0.0)
+        T = self.trading_days_ahead(days, today) / basis if basis == TRADING_BASIS else days / float(basis)
+        T = np.maximum(T, MIN_T)
+        return float(T) if T.ndim == 0 else T
+
+    def year_fraction_intraday(self, now, close, gap_hours, basis=365, progress=0.0):
+        """T from `now` to `close` today plus the settlement gap; `progress` = share of the session already passed."""
+        dt_now, dt_close = datetime.combine(date.today(), now), datetime.combine(date.today(), close)
+        minutes_total = max(0.0, (dt_close - dt_now).total_seconds() / 60.0)
+        minutes_left = minutes_total * (1 - np.asarray(progress, dtype=float))
+        T = np.maximum((minutes_left / 60.0 + gap_hours) / (float(basis) * 24.0), MIN_T)
+        return float(T) if T.ndim == 0 else T
+
+    # --- Expiry Rules ---
+    def _roll_back(self, d):
+        """An expiry on a closed day moves to the previous trading day."""
+        while not self.is_trading_day(d): d -= timedelta(days=1)
+        return d
+
+    def monthly_expiry(self, year, month):
+        rule = self.expiry_rules.get("monthly", {"weekday": 4, "week": "last"})
+        if rule.get("week", "last") == "last":
+            d = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+            while d.weekday() != rule["weekday"]: d -= timedelta(days=1)
+        else:
+            d = date(year, month, 1)
+            while d.weekday() != rule["weekday"]: d += timedelta(days=1)
+            d += timedelta(weeks=int(rule["week"]) - 1)
+        return self._roll_back(d)
+
+    def upcoming_expiries(self, today=None, weeks=8):
+        """[(date, 'Monthly' | 'Weekly')] from today on - weeklies fall on the rule weekday, monthlies win a clash."""
+        today = today or date.today()
+        horizon = today + timedelta(weeks=weeks)
+        monthly = sorted(d for d in (self.monthly_expiry(today.year + (today.month - 1 + k) // 12, (today.month - 1 + k) % 12 + 1)
+                                     for k in range(3)) if d >= today)
+        monthly = [d for i, d in enumerate(monthly) if i == 0 or d <= horizon]   # always offer the front month
+        weekday = self.expiry_rules.get("weekly", {"weekday": 4})["weekday"]
+        first = today + timedelta(days=(weekday - today.weekday()) % 7)
+        weekly = {self._roll_back(first + timedelta(weeks=k)) for k in range(weeks)} - set(monthly)
+        return sorted([(d, "Monthly") for d in monthly] + [(d, "Weekly") for d in weekly if d >= today])
+
+    def default_expiry(self, today=None):
+        """This month's expiry, or next month's once it has passed."""
+        today = today or date.today()
+        this_month = self.monthly_expiry(today.year, today.month)
+        if today <= this_month: return this_month
+        return self.monthly_expiry(today.year + today.month // 12, today.month % 12 + 1)
+
+def load_calendar_spec(path=None):
+    with open(path or CALENDAR_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+@lru_cache(maxsize=4)
+def _calendar(path, start):
+    return TradingCalendar(load_calendar_spec(path), start=start)
+
+def get_calendar(path=None):
+    """Shared calendar; tables are rebuilt once a day so `today` always sits inside them."""
+    return _calendar(path or CALENDAR_PATH, date.today() - timedelta(days=7))
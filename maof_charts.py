@@ -0,0 +1,84 @@
+import numpy as np
+import plotly.graph_objects as go
+from plotly.colors import find_intermediate_color, hex_to_rgb, label_rgb
+
+# --- Compact Line Families (WebGL) ---
+# Many-line charts (IV levels, time slices) are merged into a few Scattergl traces per
+# family: the lines are concatenated with NaN separators, so the x grid is built once
+# and every point ships as float32 instead of one Scatter + hovertemplate per line.
+
+def merge_line_family(x, y_lines, labels):
+    """Flattens (n_lines, n_points) curves into one NaN-separated float32 series."""
+    x = np.asarray(x, dtype=np.float32)
+    y_lines = np.atleast_2d(np.asarray(y_lines, dtype=np.float32))
+    n_lines, n_points = y_lines.shape
+
+    gap = np.full((n_lines, 1), np.nan, dtype=np.float32)
+    x_flat = np.tile(np.append(x, np.float32(np.nan)), n_lines)
+    y_flat = np.hstack([y_lines, gap]).ravel()
+
+    labels = np.asarray(labels)
+    if labels.dtype.kind in 'fiu': labels = labels.astype(np.float32)
+    custom = np.repeat(labels, n_points + 1)
+    return x_flat, y_flat, custom
+
+def gradient_color(c1, c2, t):
+    """Hex color at position t (0..1) between two hex colors."""
+    if c1 == c2: return c1
+    rgb = find_intermediate_color(hex_to_rgb(c1), hex_to_rgb(c2), float(t))
+    return label_rgb(tuple(int(round(v)) for v in rgb))
+
+def add_line_family(fig, x, y_lines, labels, name, color_range, n_shades=4, label_fmt="%{customdata}", width=1.5, dash='solid', value_title="P&L", showlegend=True, value_fmt=",.0f"):
+    """
+    Adds a family of curves as up to n_shades WebGL traces (one legend entry).
+    color_range = (first, last) hex colors; consecutive lines share a shade of that gradient.
+    label_fmt is the hover label of a line, e.g. "IV %{customdata:.1f}%"; value_fmt formats the y value.
+    """
+    n_lines = len(labels)
+    if n_lines == 0: return fig
+    y_lines = np.atleast_2d(np.asarray(y_lines))
+    labels = np.asarray(labels)
+    c_first, c_last = color_range
+
+    buckets = np.array_split(np.arange(n_lines), min(n_shades, n_lines))
+    for b_idx, rows in enumerate(buckets):
+        x_flat, y_flat, custom = merge_line_family(x, y_lines[rows], labels[rows])
+        t = b_idx / (len(buckets) - 1) if len(buckets) > 1 else 1.0
+        fig.add_trace(go.Scattergl(
+            x=x_flat, y=y_flat, customdata=custom, mode='lines', name=name,
+            line=dict(color=gradient_color(c_first, c_last, t), width=width, dash=dash),
+            connectgaps=False, legendgroup=name, showlegend=showlegend and b_idx == len(buckets) - 1,
+            hovertemplate=f"<b>{name}: {label_fmt}</b><br>Spot: %{{x:,.0f}}<br>{value_title}: %{{y:{value_fmt}}}<extra></extra>"
+        ))
+    return fig
+
+# --- Client-Side Animation ---
+# A precomputed cube ships as Plotly frames that only carry the y arrays of the existing traces
+# (x, colors and hover labels stay in the base figure), so the slider scrubs in the browser.
+
+def family_y(y_lines, n_shades=4):
+    """The y arrays of the traces add_line_family draws for y_lines, in the same order."""
+    y_lines = np.atleast_2d(np.asarray(y_lines, dtype=np.float32))
+    n_lines = len(y_lines)
+    if n_lines == 0: return []
+    gap = np.full((n_lines, 1), np.nan, dtype=np.float32)
+    padded = np.hstack([y_lines, gap])
+    return [padded[rows].ravel() for rows in np.array_split(np.arange(n_lines), min(n_shades, n_lines))]
+
+def add_frames(fig, frame_ys, frame_labels, prefix="", y_range=None):
+    """
+    Adds one frame per entry of frame_ys (a list of y arrays, one per trace of fig) plus a slider
+    and a play button. y_range pins the axis so every frame is drawn on the same scale.
+    """
+    fig.frames = [go.Frame(name=str(i), data=[dict(type=trace.type, y=y) for trace, y in zip(fig.data, ys)])
+                  for i, ys in enumerate(frame_ys)]
+    play = dict(frame=dict(duration=150, redraw=True), transition=dict(duration=0), fromcurrent=True, mode="immediate")
+    still = dict(frame=dict(duration=0, redraw=True), transition=dict(duration=0), mode="immediate")
+    fig.update_layout(
+        sliders=[dict(active=0, pad=dict(t=30), currentvalue=dict(prefix=prefix),
+                      steps=[dict(method="animate", label=str(label), args=[[str(i)], still]) for i, label in enumerate(frame_labels)])],
+        updatemenus=[dict(type="buttons", direction="left", x=0, y=0, xanchor="right", yanchor="top", pad=dict(t=30, r=10), showactive=False,
+                          buttons=[dict(label="▶", method="animate", args=[None, play]),
+                                   dict(label="⏸", method="animate", args=[[None], still])])])
+    if y_range is not None: fig.update_yaxes(range=y_range)
+    return fig
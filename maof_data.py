@@ -1,50 +1,75 @@
-import requests
-import yfinance as yf
 import re
 import numpy as np
 
+import maof_metrics as metrics
+
 def get_market_price():
+    # Networking libs load on first fetch, not on import
+    import requests
+    import yfinance as yf
+
     price = None
     source = ""
     # 1. TASE API
     try:
-        url = "https://api.tase.co.il/api/index/rec/Indices"
-        headers = {"User-Agent": "Mozilla/5.0", "Referer": "https://www.tase.co.il/"}
-        r = requests.get(url, headers=headers, timeout=4)
-        if r.status_code == 200:
-            data = r.json()
-            for idx in data['indices']:
-                if idx['indexId'] == 137: 
-                    price = float(idx['lastPrice'])
-                    source = "TASE API"
-                    break
+        with metrics.fetch("tase_api") as call:
+            url = "https://api.tase.co.il/api/index/rec/Indices"
+            headers = {"User-Agent": "Mozilla/5.0", "Referer": "https://www.tase.co.il/"}
+            r = requests.get(url, headers=headers, timeout=4)
+            if r.status_code == 200:
+                data = r.json()
+                for idx in data['indices']:
+                    if idx['indexId'] == 137: 
+                        price = float(idx['lastPrice'])
+                        source = "TASE API"
+                        call.ok()
+                        break
     except: pass
 
     # 2. Google Finance Scraping
     if price is None:
         try:
-            url = "https://www.google.com/finance/quote/TA35:TLV"
-            headers = {"User-Agent": "Mozilla/5.0"}
-            r = requests.get(url, headers=headers, timeout=4)
-            if r.status_code == 200:
-                match = re.search(r'class="YMlKec fxKbKc">([0-9,.]+)<', r.text)
-                if match:
-                    price = float(match.group(1).replace(',', ''))
-                    source = "Google Finance"
+            with metrics.fetch("google_finance") as call:
+                url = "https://www.google.com/finance/quote/TA35:TLV"
+                headers = {"User-Agent": "Mozilla/5.0"}
+                r = requests.get(url, headers=headers, timeout=4)
+                if r.status_code == 200:
+                    match = re.search(r'class="YMlKec fxKbKc">([0-9,.]+)<', r.text)
+                    if match:
+                        price = float(match.group(1).replace(',', ''))
+                        source = "Google Finance"
+                        call.ok()
         except: pass
 
     # 3. Yahoo Finance
     if price is None:
         try:
-            ticker = yf.Ticker("^TA35.TA")
-            price = ticker.fast_info.get('last_price')
-            if price and not np.isnan(price):
-                source = "Yahoo Live"
-            else:
-                hist = ticker.history(period="5d")
-                if not hist.empty:
-                    price = hist['Close'].iloc[-1]
-                    source = "Yahoo History"
+            with metrics.fetch("yahoo") as call:
+                ticker = yf.Ticker("^TA35.TA")
+                price = ticker.fast_info.get('last_price')
+                if price and not np.isnan(price):
+                    source = "Yahoo Live"
+                    call.ok()
+                else:
+                    hist = ticker.history(period="5d")
+                    if not hist.empty:
+                        price = hist['Close'].iloc[-1]
+                        source = "Yahoo History"
+                        call.ok()
         except: pass
-            
-    return price, source
\ No newline at end of file
+
+    # Anything but the primary feed is a degraded answer
+    if source != "TASE API": metrics.fallback("spot", source)
+    return price, source
+
+def get_price_history(period="5y"):
+    """Daily TA-35 closes (Yahoo) - None if unavailable."""
+    import yfinance as yf
+    try:
+        with metrics.fetch("yahoo_history") as call:
+            hist = yf.Ticker("^TA35.TA").history(period=period)
+            if not hist.empty:
+                call.ok()
+                return hist['Close'].to_numpy()
+    except: pass
+    return None
\ No newline at end of file
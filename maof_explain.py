@@ -0,0 +1,64 @@
+from collections import namedtuple
+import time
+import numpy as np
+import pandas as pd
+
+import maof_logic as logic
+import maof_metrics as metrics
+
+# --- P&L Explain ---
+# A snapshot prices every contract once at the start state and keeps its value and greeks. The
+# explain then needs one repricing at the end state: the change is split per contract into
+#   delta  dV/dS * dS            gamma  1/2 * d2V/dS2 * dS^2
+#   theta  dV/dt * (T0 - T1)     vega   dV/dvol * dvol
+# and whatever the Taylor terms miss (higher orders, cross terms, rate moves) is the residual.
+# Contract terms roll up to portfolios with the same Q matrix used for pricing.
+
+MarketState = namedtuple("MarketState", ["spot", "T", "r", "vol"])
+TERMS = ['Delta', 'Gamma', 'Theta', 'Vega']
+
+def take_snapshot(portfolios, state, multiplier, names=None):
+    """Positions, values and greeks per contract at `state` - keep it and explain against later states."""
+    book = logic.build_contract_matrix(portfolios)
+    price, delta, gamma, _, vega = logic.bs_calc_batch(state.spot, book['strike'], state.T, state.r, state.vol, book['is_call'])
+    # Theta per year from the Black-Scholes PDE: right for calls and puts alike, and independent of
+    # the day-count basis behind T (the chain's theta is a per-calendar-day display figure)
+    theta = state.r * price - state.r * state.spot * delta - 0.5 * state.vol**2 * state.spot**2 * gamma
+    return {'book': book, 'state': state, 'multiplier': multiplier, 'taken_at': time.time(),
+            'names': list(names) if names is not None else [f"Portfolio {i + 1}" for i in range(book['Q'].shape[0])],
+            'price': price, 'delta': delta, 'gamma': gamma, 'theta': theta, 'vega': vega * 100}
+
+@metrics.timed("pnl_explain")
+def explain_pnl(snapshot, end):
+    """
+    P&L change from the snapshot state to `end`, split into greek terms and a residual.
+    DataFrame per portfolio: Start, End, Actual, Delta, Gamma, Theta, Vega, Explained, Residual.
+    """
+    book, start, mult = snapshot['book'], snapshot['state'], snapshot['multiplier']
+    Q, costs = book['Q'], book['costs']
+    names = snapshot['names']
+    if Q.shape[1] == 0:
+        return pd.DataFrame(0.0, index=names, columns=['Start', 'End', 'Actual'] + TERMS + ['Explained', 'Residual'])
+
+    end_price, _, _, _, _ = logic.bs_calc_batch(end.spot, book['strike'], end.T, end.r, end.vol, book['is_call'])
+    d_spot, d_vol, d_t = end.spot - start.spot, end.vol - start.vol, start.T - end.T
+
+    # (term, contract) -> Q @ -> (portfolio, term), all in money
+    per_contract = np.vstack([
+        snapshot['delta'] * d_spot,
+        0.5 * snapshot['gamma'] * d_spot**2,
+        snapshot['theta'] * d_t,
+        snapshot['vega'] * d_vol,
+        snapshot['price'],
+        end_price,
+    ]) * mult
+    by_port = np.asarray(Q @ per_contract.T)
+    terms, start_value, end_value = by_port[:, :4], by_port[:, 4], by_port[:, 5]
+
+    df = pd.DataFrame(terms, index=names, columns=TERMS)
+    df.insert(0, 'Start', start_value - costs)
+    df.insert(1, 'End', end_value - costs)
+    df.insert(2, 'Actual', end_value - start_value)
+    df['Explained'] = terms.sum(axis=1)
+    df['Residual'] = df['Actual'] - df['Explained']
+    return df
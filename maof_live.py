@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import os
+import queue
+import threading
+import time
+import weakref
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+import maof_logic as logic
+import maof_shared as shared
+
+# --- Live Market Feed ---
+# Producer: one asyncio loop per feed (a daemon thread) polls the price source on an interval and
+# publishes each tick to every subscriber's bounded queue. A full queue drops its oldest tick, so
+# a slow consumer always catches up to the newest price instead of replaying a backlog.
+# Consumer: one per session - drains its queue to the latest tick and refreshes the chain window and
+# portfolio greeks from its last state (contract matrix reused, unchanged market state skipped).
+
+LIVE_INTERVAL = 2.0     # seconds between polls / dashboard refreshes
+QUEUE_SIZE = 8          # ticks buffered per subscriber before the oldest is dropped
+LIVE_CHAIN_STATES = 16  # market states (tick x expiry) of chain blocks a session keeps
+FEED_SOURCE = os.environ.get("DOR_LIVE_FEED", "Market")   # "Stub" runs without network
+
+Tick = namedtuple("Tick", ["ts", "price", "source"])
+
+class StubSource:
+    """Local random-walk feed (no network) - same contract as maof_data.get_market_price."""
+
+    def __init__(self, start=3700.0, step_pct=0.001, seed=None):
+        self.price = float(start)
+        self.step_pct = step_pct
+        self._rng = np.random.default_rng(seed)
+
+    def __call__(self):
+        self.price *= float(np.exp(self._rng.normal(0.0, self.step_pct)))
+        return round(self.price, 2), "Stub"
+
+def market_source():
+    import maof_sources as sources   # live, recording or replay - per DOR_DATA_MODE
+    return sources.get_source().get_market_price()
+
+def make_source(name):
+    return StubSource() if name == "Stub" else market_source
+
+class MarketFeed:
+    """Polls a price source on its own asyncio loop; fans ticks out to bounded per-subscriber queues."""
+
+    def __init__(self, source, interval=LIVE_INTERVAL, queue_size=QUEUE_SIZE):
+        self.source = source
+        self.interval = interval
+        self.queue_size = queue_size
+        self.last_tick = None
+        self.polls = self.failures = self.dropped = 0
+        self._subscribers = weakref.WeakSet()   # a closed session's queue goes with it
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive(): return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=asyncio.run, args=(self._produce(),), name="dor-live-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock: self._subscribers.add(q)
+        if self.last_tick is not None: q.put_nowait(self.last_tick)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock: self._subscribers.discard(q)
+
+    async def _produce(self):
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            started = loop.time()
+            with self._lock: idle = not self._subscribers
+            if not idle:   # nobody watching - don't poll the sources
+                try:
+                    # Sources are blocking (requests) - keep them off the loop
+                    price, source = await loop.run_in_executor(None, self.source)
+                except Exception:
+                    price, source = None, ""
+                self.polls += 1
+                if price and np.isfinite(price): self._publish(Tick(time.time(), float(price), source))
+                else: self.failures += 1
+            await asyncio.sleep(max(0.0, self.interval - (loop.time() - started)))
+
+    def _publish(self, tick):
+        self.last_tick = tick
+        with self._lock: subscribers = list(self._subscribers)
+        for q in subscribers:
+            while True:
+                try:
+                    q.put_nowait(tick)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()   # drop the stalest tick
+                        self.dropped += 1
+                    except queue.Empty: pass
+
+    def stats(self):
+        with self._lock: n_subs = len(self._subscribers)
+        return {'Subscribers': n_subs, 'Polls': self.polls, 'Failures': self.failures, 'Dropped': self.dropped}
+
+def portfolios_key(portfolios):
+    """Content hash of the legs - the contract matrix is rebuilt only when this changes."""
+    h = hashlib.md5()
+    for df in portfolios:
+        h.update(b"|" if df is None or df.empty else pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+class LiveConsumer:
+    """Per-session consumer of one feed: newest tick wins, greeks and chain refresh only when inputs changed."""
+
+    def __init__(self, feed):
+        self.feed = feed
+        self.queue = feed.subscribe()
+        self.tick = None
+        self.skipped = 0
+        self._book_key = self._book = None
+        self._greeks_key = self._greeks = None
+        # Kept per session: a moving spot is a new market state every tick, which would churn the shared store
+        self._chains = shared.SharedMarketStore(max_states=LIVE_CHAIN_STATES)
+
+    def poll(self):
+        """Drains the queue; returns the latest tick (or the last one seen if nothing new arrived)."""
+        drained = 0
+        while True:
+            try:
+                self.tick = self.queue.get_nowait()
+                drained += 1
+            except queue.Empty:
+                break
+        self.skipped += max(0, drained - 1)
+        return self.tick
+
+    def spot(self, fallback):
+        return self.tick.price if self.tick is not None else fallback
+
+    def portfolio_greeks(self, portfolios, spot, T, r, vol, multiplier):
+        book_key = portfolios_key(portfolios)
+        if book_key != self._book_key:
+            self._book_key, self._book = book_key, logic.build_contract_matrix(portfolios)
+            self._greeks_key = None
+        state_key = shared.market_state_key(spot, T, r, vol, multiplier)
+        if state_key != self._greeks_key:
+            self._greeks_key = state_key
+            self._greeks = logic.calculate_portfolios_greeks(None, spot, T, r, vol, multiplier, book=self._book)
+        return self._greeks
+
+    def chain_window(self, spot, expiries, r, vol, multiplier, strike_interval, num_strikes, start, size):
+        """Same as SharedMarketStore.get_chain_window, on this session's own store."""
+        return self._chains.get_chain_window(spot, expiries, r, vol, multiplier, strike_interval, num_strikes, start, size)
+
+    def session_nbytes(self):
+        return self._chains.stats()['Bytes']
+
+    def shrink(self):
+        """Drops the cached chain windows - called when the session is over its memory limit."""
+        self._chains.clear()
+
+    def close(self):
+        self.feed.unsubscribe(self.queue)
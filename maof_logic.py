@@ -1,5 +1,21 @@
+import math
 import numpy as np
-from scipy.stats import norm
+
+import maof_metrics as metrics
+
+# scipy.stats costs ~1s to import just for norm - scalar paths use math.erfc,
+# array paths load scipy.special.ndtr on first use.
+SQRT_2 = math.sqrt(2.0)
+SQRT_2PI = math.sqrt(2.0 * math.pi)
+
+def norm_cdf(x):
+    if np.ndim(x) == 0:
+        return 0.5 * math.erfc(-float(x) / SQRT_2)
+    from scipy.special import ndtr
+    return ndtr(x)
+
+def norm_pdf(x):
+    return np.exp(-0.5 * np.square(x)) / SQRT_2PI
 
 def bs_calc_raw(S, K, T, r, sigma, otype):
     """
@@ -12,84 +28,202 @@ def bs_calc_raw(S, K, T, r, sigma, otype):
     d2 = d1 - sigma*np.sqrt(T)
     
     if otype.lower() == 'call':
-        price = S*norm.cdf(d1) - K*np.exp(-r*T)*norm.cdf(d2)
-        delta = norm.cdf(d1)
+        price = S*norm_cdf(d1) - K*np.exp(-r*T)*norm_cdf(d2)
+        delta = norm_cdf(d1)
     else: 
-        price = K*np.exp(-r*T)*norm.cdf(-d2) - S*norm.cdf(-d1)
-        delta = -norm.cdf(-d1)
+        price = K*np.exp(-r*T)*norm_cdf(-d2) - S*norm_cdf(-d1)
+        delta = -norm_cdf(-d1)
         
-    gamma = norm.pdf(d1)/(S*sigma*np.sqrt(T))
-    vega = S*norm.pdf(d1)*np.sqrt(T)/100
-    theta = (-S*norm.pdf(d1)*sigma/(2*np.sqrt(T)) - r*K*np.exp(-r*T)*norm.cdf(d2 if otype.lower()=='call' else -d2))/365
+    gamma = norm_pdf(d1)/(S*sigma*np.sqrt(T))
+    vega = S*norm_pdf(d1)*np.sqrt(T)/100
+    theta = (-S*norm_pdf(d1)*sigma/(2*np.sqrt(T)) - r*K*np.exp(-r*T)*norm_cdf(d2 if otype.lower()=='call' else -d2))/365
     
     return price, delta, gamma, theta, vega
 
-def calculate_portfolio_pnl(df_portfolio, s_sim, t_sim, r, vol, multiplier, is_expiry=False, vol_override=None):
+def bs_calc_batch(S, K, T, r, sigma, is_call):
     """
-    חישוב רווח/הפסד לתיק שלם
+    חישוב בלאק שולס וקטורי - אותן נוסחאות כמו bs_calc_raw, על מערכים (broadcast)
     """
-    total_pnl = 0
-    if df_portfolio.empty: return 0
-    
-    calc_vol = vol if vol_override is None else vol_override
-    
-    for _, row in df_portfolio.iterrows():
-        try:
-            k = float(row['Strike'])
-            qty = float(row['Qty'])
-            cost = float(row['Option Price'])
-            otype = row['Type']
-            val_sim = 0
-            
-            if is_expiry:
-                if otype == 'Call': val_sim = max(s_sim - k, 0) * multiplier
-                else: val_sim = max(k - s_sim, 0) * multiplier
-            else:
-                p, _, _, _, _ = bs_calc_raw(s_sim, k, t_sim, r, calc_vol, otype)
-                val_sim = p * multiplier
-                
-            total_pnl += (val_sim - cost) * qty
-        except: pass
-    return total_pnl
+    S, K, T, sigma, is_call = np.broadcast_arrays(np.asarray(S, dtype=float), np.asarray(K, dtype=float), np.asarray(T, dtype=float),
+                                                  np.asarray(sigma, dtype=float), np.asarray(is_call, dtype=bool))
+    live = T > 0
+    T_safe = np.where(live, T, 1.0)
+    sqrt_t = np.sqrt(T_safe)
+    sign = np.where(is_call, 1.0, -1.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = (np.log(S/K) + (r + 0.5*sigma**2)*T_safe) / (sigma*sqrt_t)
+        d2 = d1 - sigma*sqrt_t
+        disc_k = K*np.exp(-r*T_safe)
+        nd1 = norm_cdf(sign*d1)
+        nd2 = norm_cdf(sign*d2)
+        pdf_d1 = norm_pdf(d1)
+
+        # call: S*N(d1) - K*e^-rT*N(d2) | put: K*e^-rT*N(-d2) - S*N(-d1)
+        price = sign*(S*nd1 - disc_k*nd2)
+        delta = sign*nd1
+        gamma = pdf_d1/(S*sigma*sqrt_t)
+        vega = S*pdf_d1*sqrt_t/100
+        theta = (-S*pdf_d1*sigma/(2*sqrt_t) - r*disc_k*nd2)/365
+
+    # Expired: intrinsic value, no greeks
+    price = np.where(live, price, np.maximum(sign*(S-K), 0))
+    delta, gamma, theta, vega = (np.where(live, g, 0.0) for g in (delta, gamma, theta, vega))
+    return price, delta, gamma, theta, vega
+
+# --- Contract Engine: price each unique contract once, aggregate portfolios as Q @ prices ---
+def _as_float(col):
+    try: return np.asarray(col, dtype=float)
+    except (TypeError, ValueError):
+        out = []
+        for v in col:
+            try: out.append(float(v))
+            except: out.append(np.nan)
+        return np.array(out, dtype=float)
+
+def leg_arrays(df_portfolio, return_valid=False):
+    """
+    רגליים תקינות של תיק כמערכים: is_call, strike, qty, cost
+    """
+    if df_portfolio is None or len(df_portfolio) == 0:
+        empty = (np.zeros(0, dtype=bool), np.zeros(0), np.zeros(0), np.zeros(0))
+        return empty + (np.zeros(0, dtype=bool),) if return_valid else empty
+    types = list(df_portfolio['Type'])
+    is_call = np.array([isinstance(t, str) and t.lower() == 'call' for t in types], dtype=bool)
+    is_type = np.array([isinstance(t, str) for t in types], dtype=bool)
+    strike = _as_float(df_portfolio['Strike'])
+    qty = _as_float(df_portfolio['Qty'])
+    cost = _as_float(df_portfolio['Option Price'])
+    valid = is_type & np.isfinite(strike) & (strike > 0) & np.isfinite(qty) & np.isfinite(cost)
+    legs = (is_call[valid], strike[valid], qty[valid], cost[valid])
+    return legs + (valid,) if return_valid else legs
+
+def contract_matrix(port_idx, is_call, strike, qty, cost, n_port):
+    """
+    איחוד החוזים הייחודיים (Type, Strike) + מטריצת כמויות דלילה (תיקים x חוזים)
+    """
+    from scipy.sparse import csr_matrix
+    keys = np.column_stack([is_call.astype(float), strike])
+    unique_keys, contract_idx = np.unique(keys, axis=0, return_inverse=True)
+    contract_idx = contract_idx.ravel()
+    # duplicate (portfolio, contract) entries are summed by the sparse constructor
+    Q = csr_matrix((qty, (port_idx, contract_idx)), shape=(n_port, len(unique_keys)))
+    costs = np.bincount(port_idx, weights=cost*qty, minlength=n_port) if len(qty) else np.zeros(n_port)
+    contract_costs = np.bincount(contract_idx, weights=cost*qty, minlength=len(unique_keys)) if len(qty) else np.zeros(0)
+    return {'is_call': unique_keys[:, 0].astype(bool), 'strike': unique_keys[:, 1], 'Q': Q, 'costs': costs, 'contract_costs': contract_costs}
+
+def build_contract_matrix(portfolios):
+    """
+    מטריצת חוזים מרשימת תיקים (DataFrame לכל תיק)
+    """
+    parts = [leg_arrays(df) for df in portfolios]
+    if not parts:
+        return contract_matrix(np.zeros(0, dtype=int), np.zeros(0, dtype=bool), np.zeros(0), np.zeros(0), np.zeros(0), 0)
+    port_idx = np.concatenate([np.full(len(p[1]), i, dtype=int) for i, p in enumerate(parts)])
+    is_call, strike, qty, cost = (np.concatenate([p[j] for p in parts]) for j in range(4))
+    return contract_matrix(port_idx, is_call, strike, qty, cost, len(parts))
+
+def build_book_matrix(df_legs, portfolio_col='Portfolio'):
+    """
+    מטריצת חוזים מטבלת רגליים אחת (עמודת תיק) - ללא פיצול לתיקים, מתאים לאלפי תיקים
+    """
+    is_call, strike, qty, cost, valid = leg_arrays(df_legs, return_valid=True)
+    names = np.asarray(df_legs[portfolio_col], dtype=str) if len(df_legs) else np.zeros(0, dtype=str)
+    port_names, port_idx = np.unique(names, return_inverse=True)
+    book = contract_matrix(port_idx.ravel()[valid], is_call, strike, qty, cost, len(port_names))
+    book['names'] = list(port_names)
+    book['legs'] = np.bincount(port_idx.ravel()[valid], minlength=len(port_names))
+    return book
+
+def price_contract_grid(is_call, strike, S, T, r, vol, multiplier, is_expiry=False):
+    """
+    מחיר כל חוזה על כל נקודות התרחיש - צורה (חוזים, *grid)
+    """
+    grid_shape = np.broadcast_shapes(np.shape(S), np.shape(T), np.shape(vol))
+    lead = (-1,) + (1,)*len(grid_shape)
+    K = np.reshape(strike, lead)
+    calls = np.reshape(is_call, lead)
+    if is_expiry:
+        value = np.maximum(np.where(calls, 1.0, -1.0)*(np.asarray(S) - K), 0)
+    else:
+        value, _, _, _, _ = bs_calc_batch(S, K, T, r, vol, calls)
+    return np.broadcast_to(value, (len(strike),) + grid_shape) * multiplier
+
+@metrics.timed("pnl_grid")
+def portfolios_pnl_grid(portfolios, S, T, r, vol, multiplier, is_expiry=False, book=None):
+    """
+    רווח/הפסד לכל תיק על כל נקודות התרחיש (S, T, vol מתפרסים זה על זה) - צורה (תיקים, *grid)
+    """
+    grid_shape = np.broadcast_shapes(np.shape(S), np.shape(T), np.shape(vol))
+    if book is None: book = build_contract_matrix(portfolios)
+    n_port, n_contracts = book['Q'].shape
+    if n_contracts == 0:
+        return np.zeros((n_port,) + grid_shape)
+    prices = price_contract_grid(book['is_call'], book['strike'], S, T, r, vol, multiplier, is_expiry)
+    pnl = book['Q'] @ prices.reshape(n_contracts, -1) - book['costs'][:, None]
+    return np.asarray(pnl).reshape((n_port,) + grid_shape)
+
+@metrics.timed("greeks_grid")
+def portfolios_greeks_grid(portfolios, S, T, r, vol, multiplier, book=None):
+    """
+    רווח/הפסד ויווניות לכל תיק על כל נקודות התרחיש, מאותו d1/d2 - מילון של מערכים בצורה (תיקים, *grid)
+    """
+    grid_shape = np.broadcast_shapes(np.shape(S), np.shape(T), np.shape(vol))
+    if book is None: book = build_contract_matrix(portfolios)
+    Q, costs = book['Q'], book['costs']
+    n_port, n_contracts = Q.shape
+    if n_contracts == 0:
+        return {name: np.zeros((n_port,) + grid_shape) for name in ('PnL', 'Delta', 'Gamma', 'Theta', 'Vega')}
+
+    lead = (-1,) + (1,)*len(grid_shape)
+    p, d, g, t_val, v = bs_calc_batch(S, np.reshape(book['strike'], lead), T, r, vol, np.reshape(book['is_call'], lead))
+    # Same units as calculate_portfolios_greeks: delta/gamma per 100 contracts, theta/vega in money
+    per_contract = {'PnL': p * multiplier, 'Delta': d * 100, 'Gamma': g * 100, 'Theta': t_val * multiplier, 'Vega': v * multiplier}
+    out = {name: np.asarray(Q @ np.broadcast_to(x, (n_contracts,) + grid_shape).reshape(n_contracts, -1)).reshape((n_port,) + grid_shape)
+           for name, x in per_contract.items()}
+    out['PnL'] = out['PnL'] - costs.reshape((-1,) + (1,)*len(grid_shape))
+    return out
 
 def calculate_portfolio_greeks(df_portfolio, spot, T, r, vol, multiplier):
     """
     חישוב יווניות לתיק
     """
-    totals = {'PnL': 0, 'Delta': 0, 'Gamma': 0, 'Theta': 0, 'Vega': 0, 'Cost': 0, 'MaxProfit': 0, 'MaxLoss': 0}
-    if df_portfolio.empty: return totals
-    
-    # 1. Greeks
-    for _, row in df_portfolio.iterrows():
-        try:
-            qty = float(row['Qty'])
-            cost = float(row['Option Price'])
-            strike = float(row['Strike'])
-            otype = row['Type']
-            
-            p, d, g, t_val, v = bs_calc_raw(spot, strike, T, r, vol, otype)
-            current_val = p * multiplier
-            
-            totals['PnL'] += (current_val - cost) * qty
-            totals['Delta'] += d * 100 * qty if otype == 'Call' else d * 100 * qty 
-            totals['Gamma'] += g * 100 * qty
-            totals['Theta'] += t_val * multiplier * qty
-            totals['Vega'] += v * multiplier * qty
-            totals['Cost'] += (cost * qty)
-        except: pass
-        
-    # 2. Max PnL Scan
-    wide_scan = np.linspace(0.1, spot * 3, 100) 
-    pnl_scan = [calculate_portfolio_pnl(df_portfolio, s, 0, r, vol, multiplier, is_expiry=True) for s in wide_scan]
-    
-    totals['MaxProfit'] = np.max(pnl_scan)
-    totals['MaxLoss'] = np.min(pnl_scan)
-    
+    return calculate_portfolios_greeks([df_portfolio], spot, T, r, vol, multiplier)[0]
+
+@metrics.timed("portfolio_greeks")
+def calculate_portfolios_greeks(portfolios, spot, T, r, vol, multiplier, book=None):
+    """
+    חישוב יווניות לכמה תיקים במעבר אחד - כל חוזה ייחודי מתומחר פעם אחת
+    """
+    if book is None: book = build_contract_matrix(portfolios)
+    Q, costs = book['Q'], book['costs']
+    n_port, n_contracts = Q.shape
+
+    # 1. Greeks - per contract, then Q @ greeks per portfolio
+    if n_contracts:
+        p, d, g, t_val, v = bs_calc_batch(spot, book['strike'], T, r, vol, book['is_call'])
+        pnl = Q @ (p * multiplier) - costs
+        delta, gamma = Q @ (d * 100), Q @ (g * 100)
+        theta, vega = Q @ (t_val * multiplier), Q @ (v * multiplier)
+    else:
+        pnl = delta = gamma = theta = vega = np.zeros(n_port)
+
+    # 2. Max PnL Scan (at expiry)
+    wide_scan = np.linspace(0.1, spot * 3, 100)
+    if n_contracts:
+        prices = price_contract_grid(book['is_call'], book['strike'], wide_scan, 0, r, vol, multiplier, is_expiry=True)
+        pnl_scan = np.asarray(Q @ prices) - costs[:, None]
+    else:
+        pnl_scan = np.zeros((n_port, len(wide_scan)))
+
+    max_profit = pnl_scan.max(axis=1)
+    max_loss = pnl_scan.min(axis=1)
+
     # Infinity Check
-    boundary_threshold = spot * multiplier * 0.5 
-    if pnl_scan[-1] > boundary_threshold: totals['MaxProfit'] = float('inf')
-    if pnl_scan[-1] < -boundary_threshold: totals['MaxLoss'] = float('-inf')
-    if pnl_scan[0] > boundary_threshold: totals['MaxProfit'] = float('inf')
-    if pnl_scan[0] < -boundary_threshold: totals['MaxLoss'] = float('-inf')
+    boundary_threshold = spot * multiplier * 0.5
+    edges = pnl_scan[:, [0, -1]]
+    max_profit = np.where((edges > boundary_threshold).any(axis=1), float('inf'), max_profit)
+    max_loss = np.where((edges < -boundary_threshold).any(axis=1), float('-inf'), max_loss)
 
-    return totals
\ No newline at end of file
+    return [{'PnL': pnl[i], 'Delta': delta[i], 'Gamma': gamma[i], 'Theta': theta[i], 'Vega': vega[i], 'Cost': costs[i],
+             'MaxProfit': max_profit[i], 'MaxLoss': max_loss[i]} for i in range(n_port)]
\ No newline at end of file
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from functools import wraps
+
+# --- Operational Metrics ---
+# Process-wide counters, gauges and latency histograms for the data feeds and the pricing engine,
+# served on a local endpoint in the Prometheus text exposition format (GET /metrics):
+#   dor_fetch_seconds{source}              fetch latency histogram per data source
+#   dor_fetch_total{source, outcome}       success / failure per source
+#   dor_fetch_last_success_seconds{source} unix time of the last good answer (alert on staleness)
+#   dor_fallback_total{feed, served_by}    the feed was answered by a lower-priority source
+#   dor_pricing_seconds{op}                pricing-engine call timings
+# DOR_METRICS_PORT sets the port (0 disables the endpoint); it binds to localhost only.
+
+METRICS_PORT = int(os.environ.get("DOR_METRICS_PORT", "9464"))
+METRICS_HOST = os.environ.get("DOR_METRICS_HOST", "127.0.0.1")
+FETCH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0)
+PRICING_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+HELP = {
+    'dor_fetch_seconds': ("histogram", "Data source fetch latency in seconds"),
+    'dor_fetch_total': ("counter", "Data source fetches by outcome"),
+    'dor_fetch_last_success_seconds': ("gauge", "Unix time of the last successful fetch"),
+    'dor_fallback_total': ("counter", "Requests answered by a fallback source"),
+    'dor_pricing_seconds': ("histogram", "Pricing engine call duration in seconds"),
+}
+
+_lock = threading.Lock()
+_counters = {}     # (name, labels) -> value
+_gauges = {}       # (name, labels) -> value
+_histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+_buckets = {}      # name -> bucket bounds
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc(name, amount=1.0, **labels):
+    key = (name, _labels(labels))
+    with _lock: _counters[key] = _counters.get(key, 0.0) + amount
+
+def set_gauge(name, value, **labels):
+    with _lock: _gauges[(name, _labels(labels))] = float(value)
+
+def observe(name, value, buckets=FETCH_BUCKETS, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        bounds = _buckets.setdefault(name, tuple(buckets))
+        h = _histograms.get(key)
+        if h is None: h = _histograms[key] = [0] * (len(bounds) + 1) + [0.0]
+        h[next((i for i, b in enumerate(bounds) if value <= b), len(bounds))] += 1
+        h[-1] += value
+
+# --- Instrumentation Helpers ---
+class _Fetch:
+    """One timed fetch; counts as a failure unless ok() is called before the block ends."""
+
+    def __init__(self, source):
+        self.source = source
+        self.success = False
+
+    def ok(self):
+        self.success = True
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe('dor_fetch_seconds', time.perf_counter() - self._t0, FETCH_BUCKETS, source=self.source)
+        ok = self.success and exc_type is None
+        inc('dor_fetch_total', source=self.source, outcome="success" if ok else "failure")
+        if ok: set_gauge('dor_fetch_last_success_seconds', time.time(), source=self.source)
+        return False   # errors propagate to the caller's own handling
+
+def fetch(source):
+    """`with metrics.fetch("tase_api") as call: ...; call.ok()` - latency and outcome of one data-source call."""
+    return _Fetch(source)
+
+def fallback(feed, served_by):
+    inc('dor_fallback_total', feed=feed, served_by=served_by or "none")
+
+def timed(op):
+    """Decorator: record the call duration in dor_pricing_seconds{op}."""
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            finally: observe('dor_pricing_seconds', time.perf_counter() - t0, PRICING_BUCKETS, op=op)
+        return inner
+    return wrap
+
+# --- Text Exposition ---
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _fmt_value(v):
+    if v == float("inf"): return "+Inf"
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+def render():
+    """All metrics in the Prometheus text format (version 0.0.4)."""
+    with _lock:
+        counters, gauges = dict(_counters), dict(_gauges)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        buckets = dict(_buckets)
+
+    by_name = {}
+    for (name, labels), v in sorted(counters.items()): by_name.setdefault(name, []).append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+    for (name, labels), v in sorted(gauges.items()): by_name.setdefault(name, []).append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+    for (name, labels), h in sorted(histograms.items()):
+        lines, cumulative = by_name.setdefault(name, []), 0
+        for bound, count in zip(buckets[name] + (float("inf"),), h[:-1]):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', le)])} {cumulative}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(h[-1])}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {cumulative}")
+
+    out = []
+    for name in sorted(by_name):
+        kind, text = HELP.get(name, ("untyped", name))
+        out += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"] + by_name[name]
+    return "\n".join(out) + "\n"
+
+def snapshot():
+    """{(name, labels): value} of counters and gauges - for in-app display."""
+    with _lock: return {**_counters, **_gauges}
+
+def reset():
+    with _lock:
+        for store in (_counters, _gauges, _histograms, _buckets): store.clear()
+
+# --- Local Endpoint ---
+def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve /metrics on a daemon thread; None if disabled or the port is taken (another app process has it)."""
+    if not port: return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer   # only the endpoint needs it
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass   # scrapes every few seconds would flood the console
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        print(f"Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    server = start_server()
+    if server is not None:
+        print(f"Serving http://{METRICS_HOST}:{server.server_address[1]}/metrics - Ctrl+C to stop")
+        try:
+            while True: time.sleep(1)
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+
+# --- Local Portfolio Store (SQLite) ---
+# portfolios: one row per named book (tags, timestamps); legs: one row per leg, indexed
+# by portfolio_id so loading a book is one indexed join + one DataFrame conversion.
+
+DB_PATH = os.environ.get("DOR_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dor_portfolios.db"))
+LEG_COLUMNS = ["Type", "Strike", "Qty", "Option Price"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS portfolios (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    tags TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS legs (
+    portfolio_id INTEGER NOT NULL REFERENCES portfolios(id) ON DELETE CASCADE,
+    type TEXT NOT NULL,
+    strike REAL NOT NULL,
+    qty REAL NOT NULL,
+    price REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS portfolio_tags (
+    portfolio_id INTEGER NOT NULL REFERENCES portfolios(id) ON DELETE CASCADE,
+    tag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_legs_portfolio ON legs(portfolio_id);
+CREATE INDEX IF NOT EXISTS idx_tags_tag ON portfolio_tags(tag, portfolio_id);
+CREATE INDEX IF NOT EXISTS idx_portfolios_updated ON portfolios(updated_at);
+"""
+
+_ready_paths = set()
+_ready_lock = threading.Lock()
+
+def _ensure_schema(conn, db_path):
+    """WAL mode and the schema are set up once per database file per process, not per connection."""
+    if db_path in _ready_paths: return
+    with _ready_lock:
+        if db_path in _ready_paths: return
+        conn.execute("PRAGMA journal_mode = WAL")  # readers don't block the writer (multi-session); persists in the file
+        conn.executescript(SCHEMA)
+        _ready_paths.add(db_path)
+
+@contextmanager
+def connect(db_path=None):
+    """One transaction: commits on success, rolls back on error, always closes."""
+    db_path = db_path or DB_PATH
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        conn.execute("PRAGMA foreign_keys = ON")   # per connection
+        _ensure_schema(conn, db_path)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def _parse_tags(tags):
+    if tags is None: return []
+    if isinstance(tags, str): tags = tags.split(",")
+    return sorted({t.strip() for t in tags if t and str(t).strip()})
+
+def _leg_records(df):
+    """Legs as plain tuples - one columnar pass, no iterrows."""
+    if df is None or df.empty: return []
+    legs = df.reindex(columns=LEG_COLUMNS)
+    return list(zip(legs["Type"].astype(str),
+                    pd.to_numeric(legs["Strike"], errors="coerce").fillna(0).astype(float),
+                    pd.to_numeric(legs["Qty"], errors="coerce").fillna(0).astype(float),
+                    pd.to_numeric(legs["Option Price"], errors="coerce").fillna(0).astype(float)))
+
+def _upsert(conn, name, legs, tags, now):
+    cur = conn.execute(
+        "INSERT INTO portfolios (name, tags, created_at, updated_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET tags = excluded.tags, updated_at = excluded.updated_at "
+        "RETURNING id",
+        (name, ",".join(tags), now, now))
+    pid = cur.fetchone()[0]
+    conn.execute("DELETE FROM legs WHERE portfolio_id = ?", (pid,))
+    conn.execute("DELETE FROM portfolio_tags WHERE portfolio_id = ?", (pid,))
+    conn.executemany("INSERT INTO legs (portfolio_id, type, strike, qty, price) VALUES (?, ?, ?, ?, ?)",
+                     [(pid, *leg) for leg in legs])
+    conn.executemany("INSERT INTO portfolio_tags (portfolio_id, tag) VALUES (?, ?)", [(pid, t) for t in tags])
+    return pid
+
+def save_portfolio(name, df, tags=None, db_path=None):
+    """Creates or replaces a named portfolio. Returns its id."""
+    name = str(name).strip()
+    if not name: raise ValueError("Portfolio name is empty")
+    with connect(db_path) as conn:
+        return _upsert(conn, name, _leg_records(df), _parse_tags(tags), _now())
+
+def load_portfolio(name, db_path=None):
+    """Legs of a named portfolio as an editor-ready DataFrame (empty if not found)."""
+    with connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT l.type, l.strike, l.qty, l.price FROM portfolios p "
+            "JOIN legs l ON l.portfolio_id = p.id WHERE p.name = ? ORDER BY l.rowid",
+            (name,)).fetchall()
+    df = pd.DataFrame.from_records(rows, columns=LEG_COLUMNS)
+    for col in ["Strike", "Qty", "Option Price"]: df[col] = df[col].astype(int)
+    return df
+
+def load_portfolios(names=None, tag=None, db_path=None):
+    """Legs of many portfolios (by names and/or tag) in one query, as one long table with a Portfolio column."""
+    query = ("SELECT p.name, l.type, l.strike, l.qty, l.price FROM portfolios p "
+             "JOIN legs l ON l.portfolio_id = p.id ")
+    clauses, params = [], []
+    if names:
+        clauses.append(f"p.name IN ({','.join('?' * len(names))})")
+        params.extend(names)
+    if tag:
+        clauses.append("p.id IN (SELECT portfolio_id FROM portfolio_tags WHERE tag = ?)")
+        params.append(tag)
+    if clauses: query += "WHERE " + " AND ".join(clauses) + " "
+    query += "ORDER BY p.name, l.rowid"
+    with connect(db_path) as conn:
+        rows = conn.execute(query, params).fetchall()
+    return pd.DataFrame.from_records(rows, columns=["Portfolio", *LEG_COLUMNS])
+
+def delete_portfolio(name, db_path=None):
+    with connect(db_path) as conn:
+        conn.execute("DELETE FROM portfolios WHERE name = ?", (name,))
+
+def list_portfolios(tag=None, db_path=None):
+    """Name, tags, leg count and timestamps - newest first, optionally filtered by tag."""
+    query = ("SELECT p.name AS Name, p.tags AS Tags, "
+             "(SELECT COUNT(*) FROM legs l WHERE l.portfolio_id = p.id) AS Legs, "
+             "p.created_at AS Created, p.updated_at AS Updated FROM portfolios p ")
+    params = ()
+    if tag:
+        query += "JOIN portfolio_tags t ON t.portfolio_id = p.id WHERE t.tag = ? "
+        params = (tag,)
+    query += "ORDER BY p.updated_at DESC"
+    with connect(db_path) as conn:
+        cur = conn.execute(query, params)
+        columns = [c[0] for c in cur.description]
+        return pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+
+def list_tags(db_path=None):
+    with connect(db_path) as conn:
+        return [row[0] for row in conn.execute("SELECT DISTINCT tag FROM portfolio_tags ORDER BY tag")]
+
+# --- Bulk CSV (long format: one row per leg) ---
+# Portfolio, Type, Strike, Qty, Option Price[, Tags]
+
+def import_csv(source, db_path=None):
+    """Bulk-imports portfolios from a CSV path or buffer in one transaction. Returns the count."""
+    df = pd.read_csv(source)
+    missing = {"Portfolio", *LEG_COLUMNS} - set(df.columns)
+    if missing: raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+    df["Portfolio"] = df["Portfolio"].astype(str).str.strip()
+    tags = df["Tags"].fillna("").astype(str) if "Tags" in df.columns else pd.Series("", index=df.index)
+    heads = df.assign(Tags=tags).drop_duplicates("Portfolio")
+    books = [(name, ",".join(_parse_tags(t))) for name, t in zip(heads["Portfolio"], heads["Tags"])]
+
+    now = _now()
+    with connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO portfolios (name, tags, created_at, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET tags = excluded.tags, updated_at = excluded.updated_at",
+            [(name, t, now, now) for name, t in books])
+        ids = dict(conn.execute("SELECT name, id FROM portfolios"))
+        pids = [(ids[name],) for name, _ in books]
+        conn.executemany("DELETE FROM legs WHERE portfolio_id = ?", pids)
+        conn.executemany("DELETE FROM portfolio_tags WHERE portfolio_id = ?", pids)
+
+        leg_pids = df["Portfolio"].map(ids).astype(int).tolist()
+        conn.executemany("INSERT INTO legs (portfolio_id, type, strike, qty, price) VALUES (?, ?, ?, ?, ?)",
+                         [(pid, *leg) for pid, leg in zip(leg_pids, _leg_records(df))])
+        conn.executemany("INSERT INTO portfolio_tags (portfolio_id, tag) VALUES (?, ?)",
+                         [(ids[name], tag) for name, t in books for tag in _parse_tags(t)])
+    return len(books)
+
+def export_csv(target=None, names=None, db_path=None):
+    """Exports portfolios (all, or the given names) in the import format. Returns CSV text if target is None."""
+    query = ("SELECT p.name, l.type, l.strike, l.qty, l.price, p.tags FROM portfolios p "
+             "JOIN legs l ON l.portfolio_id = p.id ")
+    params = ()
+    if names:
+        query += f"WHERE p.name IN ({','.join('?' * len(names))}) "
+        params = tuple(names)
+    query += "ORDER BY p.name, l.rowid"
+    with connect(db_path) as conn:
+        rows = conn.execute(query, params).fetchall()
+    df = pd.DataFrame.from_records(rows, columns=["Portfolio", *LEG_COLUMNS, "Tags"])
+    return df.to_csv(target, index=False, float_format="%g")
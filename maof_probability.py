@@ -0,0 +1,94 @@
+import numpy as np
+
+import maof_logic as logic
+import maof_metrics as metrics
+
+# --- Closed-Form Expiry Probabilities ---
+# The expiry P&L of any portfolio is piecewise linear between strikes: a + b*S on each segment.
+# Under the lognormal (risk-neutral drift r) both P(L < S_T <= U) and E[S_T; L < S_T <= U] are
+# closed form, so POP and expected P&L are exact sums over segments - no Monte Carlo, no grid.
+# Everything broadcasts as (vol levels, portfolios, segments).
+
+def expiry_segments(book, multiplier):
+    """Knots [0, strikes..., inf] and per-portfolio intercept/slope (n_port, n_seg) of the expiry P&L."""
+    strikes = np.unique(book['strike'])
+    knots = np.concatenate([[0.0], strikes, [np.inf]])
+    lo, hi = knots[:-1], knots[1:]
+
+    # Each contract is linear on every segment: call = S - K right of its strike, put = K - S left of it
+    K = book['strike'][:, None]
+    call_on = book['is_call'][:, None] & (K <= lo[None, :])
+    put_on = ~book['is_call'][:, None] & (K >= hi[None, :])
+    a = np.where(call_on, -K, 0.0) + np.where(put_on, K, 0.0)
+    b = call_on.astype(float) - put_on.astype(float)
+
+    Q = book['Q']
+    a_port = np.asarray(Q @ a) * multiplier - book['costs'][:, None]
+    b_port = np.asarray(Q @ b) * multiplier
+    return knots, a_port, b_port
+
+def _lognormal_parts(x, spot, T, r, vol):
+    """P(S_T <= x) and E[S_T; S_T <= x] for the lognormal with drift r (x may be 0 or inf)."""
+    sd = vol * np.sqrt(T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d2 = (np.log(spot / x) + (r - 0.5 * vol**2) * T) / sd
+    cdf = logic.norm_cdf(-d2)
+    partial_mean = spot * np.exp(r * T) * logic.norm_cdf(-(d2 + sd))
+    return cdf, partial_mean
+
+def touch_probability(level, spot, T, r, vol):
+    """P(the spot path touches `level` before T) - reflection principle for GBM with drift r."""
+    nu = r - 0.5 * vol**2
+    sd = vol * np.sqrt(T)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        m = np.log(level / spot)
+        sign = np.where(m >= 0, 1.0, -1.0)       # up-crossing vs down-crossing
+        p = logic.norm_cdf((-sign * m + sign * nu * T) / sd) + np.exp(2 * nu * m / vol**2) * logic.norm_cdf((-sign * m - sign * nu * T) / sd)
+    return np.clip(np.where(np.isfinite(level), p, np.nan), 0.0, 1.0)
+
+@metrics.timed("probability")
+def probability_analytics(portfolios, spot, T, r, vol, multiplier, book=None):
+    """
+    Probability of profit, expected P&L at expiry, breakevens and the chance of touching each.
+    vol may be a scalar or an array of levels: POP / ExpectedPnL are (n_port,) or (n_vol, n_port);
+    Breakevens is one sorted array per portfolio; TouchProb matches it ((n_vol, k) for array vol).
+    """
+    if book is None: book = logic.build_contract_matrix(portfolios)
+    knots, a, b = expiry_segments(book, multiplier)
+    lo, hi = knots[:-1], knots[1:]
+    vol_arr = np.asarray(vol, dtype=float)
+    v = vol_arr.reshape(-1, 1, 1)                  # (n_vol, 1, 1)
+
+    # Expected P&L: sum over segments of a*P(seg) + b*E[S; seg]
+    cdf, pmean = _lognormal_parts(knots[None, None, :], spot, T, r, v)
+    p_seg, m_seg = np.diff(cdf, axis=-1), np.diff(pmean, axis=-1)
+    expected = (a[None] * p_seg + b[None] * m_seg).sum(axis=-1)
+
+    # Breakevens: root of a + b*S strictly inside a segment, or a segment edge where the sign flips
+    with np.errstate(divide='ignore', invalid='ignore'):
+        root = np.where(b != 0, -a / b, np.nan)
+    inside = (root > lo) & (root < hi)
+
+    # POP: profitable part of each segment - whole, none, or one side of the root
+    whole = ((b == 0) & (a > 0)) | ((b != 0) & ~inside & (a + b * np.where(np.isfinite(hi), (lo + hi) / 2, lo + 1) > 0))
+    up_lo = np.where(inside & (b > 0), root, lo)          # profitable above the root
+    dn_hi = np.where(inside & (b < 0), root, hi)          # profitable below the root
+    prof_lo = np.where(whole, lo, np.where(inside, up_lo, np.nan))
+    prof_hi = np.where(whole, hi, np.where(inside, dn_hi, np.nan))
+    c_lo, _ = _lognormal_parts(np.nan_to_num(prof_lo, nan=0.0)[None], spot, T, r, v)
+    c_hi, _ = _lognormal_parts(np.nan_to_num(prof_hi, nan=0.0)[None], spot, T, r, v)
+    pop = np.where(np.isnan(prof_lo)[None], 0.0, c_hi - c_lo).sum(axis=-1)
+
+    breakevens = []
+    touch = []
+    for i in range(a.shape[0]):
+        levels = root[i][inside[i]]
+        # A kink exactly at a strike where the P&L crosses zero
+        edge = (np.abs(a[i, 1:] + b[i, 1:] * lo[1:]) < 1e-9) & (np.sign(a[i, :-1] + b[i, :-1] * (lo[1:] - 1)) != np.sign(a[i, 1:] + b[i, 1:] * (lo[1:] + 1)))
+        levels = np.unique(np.concatenate([levels, lo[1:][edge]]))
+        breakevens.append(levels)
+        touch.append(touch_probability(levels[None, :], spot, T, r, vol_arr.reshape(-1, 1)))
+
+    if vol_arr.ndim == 0:
+        return {'POP': pop[0], 'ExpectedPnL': expected[0], 'Breakevens': breakevens, 'TouchProb': [t[0] for t in touch]}
+    return {'POP': pop, 'ExpectedPnL': expected, 'Breakevens': breakevens, 'TouchProb': touch}
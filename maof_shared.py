@@ -0,0 +1,183 @@
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+import maof_logic as logic
+import maof_metrics as metrics
+
+# --- Server-Wide Shared Compute ---
+# One store per server process (main.py holds it with st.cache_resource). Chains and leg
+# prices are keyed by market state, so every session looking at the same market shares
+# one copy - host memory grows with distinct market states, not with open tabs.
+
+MAX_MARKET_STATES = 32
+CHAIN_BLOCK = 100          # chain rows priced together
+
+def market_state_key(spot, T, r, vol, multiplier):
+    """Rounded so UI float noise maps to the same state."""
+    return (round(float(spot), 2), round(float(T), 8), round(float(r), 6), round(float(vol), 6), int(multiplier))
+
+class SharedMarketStore:
+    """Thread-safe LRU of per-market-state chains and price caches."""
+
+    def __init__(self, max_states=MAX_MARKET_STATES):
+        self.max_states = max_states
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _state(self, key):
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = {'prices': {}, 'blocks': {}}
+                self._states[key] = state
+                while len(self._states) > self.max_states:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(key)
+            return state
+
+    def get_chain_block(self, spot, T, r, vol, multiplier, strike_interval, num_strikes, block):
+        """Rows [block * CHAIN_BLOCK, (block + 1) * CHAIN_BLOCK) of the chain - priced on first request."""
+        state = self._state(market_state_key(spot, T, r, vol, multiplier))
+        block_key = (int(strike_interval), int(num_strikes), int(block))
+        df_block = state['blocks'].get(block_key)
+        if df_block is not None:
+            with self._lock: self.hits += 1
+            return df_block
+
+        strikes = chain_strikes(spot, strike_interval, num_strikes)[block * CHAIN_BLOCK:(block + 1) * CHAIN_BLOCK]
+        df_block = price_chain_rows(spot, strikes, T, r, vol, multiplier)
+        with self._lock:
+            self.misses += 1
+            return state['blocks'].setdefault(block_key, df_block)
+
+    def get_chain_window(self, spot, expiries, r, vol, multiplier, strike_interval, num_strikes, start, size):
+        """
+        (rows, total) - rows [start, start + size) of a chain stacked expiry by expiry.
+        expiries = [(label, T)]; only the blocks the window touches are priced, each cached
+        under its own expiry's market state. An Expiry column is added when there are several.
+        """
+        n_strikes = int(num_strikes) + 1
+        total = n_strikes * len(expiries)
+        start, stop = max(0, min(int(start), total - 1)), min(int(start) + int(size), total)
+        parts = []
+        for e, (label, T) in enumerate(expiries):
+            lo, hi = max(start - e * n_strikes, 0), min(stop - e * n_strikes, n_strikes)   # window rows inside this expiry
+            if lo >= hi: continue
+            for block in range(lo // CHAIN_BLOCK, (hi - 1) // CHAIN_BLOCK + 1):
+                df_block = self.get_chain_block(spot, T, r, vol, multiplier, strike_interval, num_strikes, block)
+                b0 = block * CHAIN_BLOCK
+                part = df_block.iloc[max(lo - b0, 0):hi - b0]
+                parts.append(part.assign(Expiry=label) if len(expiries) > 1 else part)
+        if not parts: return price_chain_rows(spot, np.array([], dtype=float), 0.0, r, vol, multiplier), total
+        return pd.concat(parts, ignore_index=True), total
+
+    def get_option_price(self, spot, T, r, vol, multiplier, otype, strike):
+        """Theoretical price (already multiplied) of one contract, cached per market state."""
+        state = self._state(market_state_key(spot, T, r, vol, multiplier))
+        price_key = (otype.lower(), float(strike))
+        price = state['prices'].get(price_key)
+        if price is not None:
+            with self._lock: self.hits += 1
+            return price
+
+        p, _, _, _, _ = logic.bs_calc_raw(spot, float(strike), T, r, vol, otype)
+        with self._lock:
+            self.misses += 1
+            return state['prices'].setdefault(price_key, p * multiplier)
+
+    def clear(self):
+        with self._lock: self._states.clear()
+
+    def stats(self):
+        with self._lock:
+            states = list(self._states.values())
+        prices = sum(len(s['prices']) for s in states)
+        blocks = sum(len(s['blocks']) for s in states)
+        nbytes = sum(df.memory_usage(deep=True).sum() for s in states for df in s['blocks'].values())
+        return {'States': len(states), 'Blocks': blocks, 'Prices': prices, 'Bytes': int(nbytes), 'Hits': self.hits, 'Misses': self.misses}
+
+def chain_strikes(calculation_spot, strike_interval, num_strikes):
+    """The strike ladder around the ATM strike (num_strikes + 1 rows)."""
+    center = round(calculation_spot / strike_interval) * strike_interval
+    return center + (np.arange(num_strikes + 1) - num_strikes//2) * strike_interval
+
+@metrics.timed("chain_rows")
+def price_chain_rows(calculation_spot, strikes, T, r, vol, multiplier):
+    """Chain rows for the given strikes - both sides priced in one vectorized pass."""
+    c_p, c_d, c_g, c_t, c_v = logic.bs_calc_batch(calculation_spot, strikes, T, r, vol, True)
+    p_p, p_d, p_g, p_t, p_v = logic.bs_calc_batch(calculation_spot, strikes, T, r, vol, False)
+    as_int = lambda x: np.trunc(np.nan_to_num(x)).astype(int)
+
+    return pd.DataFrame({
+        'C_Vega': as_int(c_v * multiplier), 'C_Theta': as_int(c_t * multiplier),
+        'C_Gamma': np.round(c_g * 100, 2), 'C_Delta': as_int(c_d * 100), 'Call_Price': as_int(c_p * multiplier),
+        'Strike': strikes.astype(int),
+        'Put_Price': as_int(p_p * multiplier), 'P_Delta': as_int(p_d * 100),
+        'P_Gamma': np.round(p_g * 100, 2), 'P_Theta': as_int(p_t * multiplier), 'P_Vega': as_int(p_v * multiplier)
+    })
+
+# --- Per-Session Memory Accounting ---
+SESSION_MEMORY_LIMIT = 8 * 1024 * 1024   # bytes of session_state per browser tab
+MAX_PORTFOLIO_LEGS = 500
+
+def object_nbytes(obj):
+    if isinstance(obj, pd.DataFrame): return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, np.ndarray): return int(obj.nbytes)
+    if hasattr(obj, 'indptr'): return int(obj.data.nbytes + obj.indices.nbytes + obj.indptr.nbytes)   # scipy sparse
+    if hasattr(obj, 'session_nbytes'): return int(obj.session_nbytes())
+    if isinstance(obj, dict): return sys.getsizeof(obj) + sum(object_nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)): return sys.getsizeof(obj) + sum(object_nbytes(v) for v in obj)
+    return sys.getsizeof(obj)
+
+def session_memory_usage(session_state):
+    """Bytes held by a session, per key (largest first)."""
+    usage = {}
+    for key in list(session_state.keys()):
+        try: usage[key] = object_nbytes(session_state[key])
+        except: pass
+    return dict(sorted(usage.items(), key=lambda kv: -kv[1]))
+
+# Derived results a session can rebuild on demand - the first to go when it is over its limit
+EVICTABLE_KEYS = ('hedge_view', 'explain_snapshot')
+
+def enforce_session_limit(session_state, limit=SESSION_MEMORY_LIMIT):
+    """
+    Holds a session to `limit` bytes: derived results are dropped and per-session caches
+    (objects with shrink()) emptied, largest first. Returns (bytes left, keys released).
+    """
+    usage = session_memory_usage(session_state)
+    total, released = sum(usage.values()), []
+    for key, nbytes in usage.items():
+        if total <= limit: break
+        if key in EVICTABLE_KEYS:
+            del session_state[key]
+        elif hasattr(session_state[key], 'shrink'):
+            session_state[key].shrink()
+            nbytes -= object_nbytes(session_state[key])
+        else:
+            continue
+        total -= nbytes
+        released.append(key)
+    return total, released
+
+def store_result(session_state, key, value, limit=SESSION_MEMORY_LIMIT):
+    """Keeps a derived result if the session can hold it (older results are evicted first); False = refused."""
+    nbytes = object_nbytes(value)
+    session_state.pop(key, None)
+    total, _ = enforce_session_limit(session_state, limit - nbytes)
+    if total + nbytes > limit: return False
+    session_state[key] = value
+    return True
+
+def compact_portfolio(df):
+    """Portfolio legs as int32 (the editor only holds whole numbers)."""
+    if df.empty: return df
+    for col in ['Strike', 'Qty', 'Option Price']:
+        if col in df.columns: df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(np.int32)
+    return df
@@ -0,0 +1,175 @@
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# --- Market Data Sources: Live / Record / Replay ---
+# Every consumer asks a source for quotes, chains and price history; which one answers is configuration:
+#   DOR_DATA_MODE=live     live TASE / Google / Yahoo / Investing (default)
+#   DOR_DATA_MODE=record   live, and every quote, chain and history is appended to DOR_DATA_PATH
+#   DOR_DATA_MODE=replay   served back from DOR_DATA_PATH at DOR_REPLAY_SPEED (1 = original pace,
+#                          10 = 10x, 0 = as fast as called: each call returns the next record);
+#                          DOR_REPLAY_LOOP=1 starts the recording over when it runs out
+# Recordings are gzip JSON lines: {"t": epoch, "kind": "quote" | "chain" | "history", ...} - one stream, append-only.
+
+DATA_MODE = os.environ.get("DOR_DATA_MODE", "live")
+DATA_PATH = os.environ.get("DOR_DATA_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "dor_recording.jsonl.gz"))
+REPLAY_SPEED = float(os.environ.get("DOR_REPLAY_SPEED", "1"))
+REPLAY_LOOP = os.environ.get("DOR_REPLAY_LOOP", "0") == "1"
+
+class LiveSource:
+    """The real endpoints (network libraries load on first call)."""
+    name = "Live"
+
+    def get_market_price(self):
+        import maof_data as data
+        return data.get_market_price()
+
+    def get_options_chain(self):
+        import tase_data
+        return tase_data.fetch_options_chain()
+
+    def get_price_history(self):
+        import maof_data as data
+        return data.get_price_history()
+
+class RecordingSource:
+    """Passes through to `inner` and appends every answer, timestamped, to `path`."""
+    name = "Record"
+
+    def __init__(self, inner, path=None):
+        self.inner = inner
+        self.path = path or DATA_PATH
+        self._lock = threading.Lock()
+        self._file = None
+        self.records = 0
+
+    def _write(self, record):
+        with self._lock:
+            if self._file is None:
+                self._file = gzip.open(self.path, "at", encoding="utf-8")
+                atexit.register(self.close)
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._file.flush()   # sync flush: the file stays readable if the process dies
+            self.records += 1
+
+    def get_market_price(self):
+        price, source = self.inner.get_market_price()
+        if price is not None: self._write({"t": time.time(), "kind": "quote", "price": float(price), "source": source})
+        return price, source
+
+    def get_options_chain(self):
+        df = self.inner.get_options_chain()
+        if df is not None and not df.empty:
+            split = df.astype(object).where(df.notna(), None).to_dict(orient="split", index=False)   # NaN / <NA> -> null
+            self._write({"t": time.time(), "kind": "chain", "columns": split["columns"], "data": split["data"]})
+        return df
+
+    def get_price_history(self):
+        closes = self.inner.get_price_history()
+        if closes is not None and len(closes): self._write({"t": time.time(), "kind": "history", "closes": np.asarray(closes, dtype=float).tolist()})
+        return closes
+
+    def close(self):
+        with self._lock:
+            if self._file is not None: self._file.close()
+            self._file = None
+
+def read_recording(path=None):
+    """All records in order; a torn tail (process killed mid-write) is ignored."""
+    records = []
+    try:
+        with gzip.open(path or DATA_PATH, "rt", encoding="utf-8") as f:
+            for line in f:
+                try: records.append(json.loads(line))
+                except ValueError: break
+    except (EOFError, gzip.BadGzipFile):
+        pass
+    return records
+
+def load_recording(path=None):
+    """(quotes DataFrame [t, price, source], [(t, chain DataFrame)], [(t, daily closes array)]) - for backtests and benchmarks."""
+    records = read_recording(path)
+    quotes = pd.DataFrame([r for r in records if r["kind"] == "quote"], columns=["t", "price", "source"])
+    chains = [(r["t"], _typed_chain(pd.DataFrame(r["data"], columns=r["columns"]))) for r in records if r["kind"] == "chain"]
+    history = [(r["t"], np.asarray(r["closes"], dtype=float)) for r in records if r["kind"] == "history"]
+    return quotes, chains, history
+
+def _typed_chain(df):
+    """Back to the live parser's dtypes (JSON keeps only numbers, strings and nulls)."""
+    from tase_data import CHAIN_COLUMNS
+    for col, dtype in CHAIN_COLUMNS.items():
+        if col not in df.columns: continue
+        if dtype == 'Int64': df[col] = pd.to_numeric(df[col], errors="coerce").round().astype('Int64')
+        elif dtype == 'float64': df[col] = pd.to_numeric(df[col], errors="coerce").astype(float)
+    return df
+
+class ReplaySource:
+    """Serves a recording through the same interface, on the recorded clock scaled by `speed`."""
+    name = "Replay"
+
+    def __init__(self, path=None, speed=REPLAY_SPEED, loop=REPLAY_LOOP):
+        self.speed = speed
+        self.loop = loop
+        quotes, chains, history = load_recording(path)
+        self._streams = {"quote": [(t, (p, s)) for t, p, s in quotes.itertuples(index=False)], "chain": chains, "history": history}
+        times = [t for stream in self._streams.values() for t, _ in stream]
+        self._t0 = min(times) if times else 0.0
+        self._t_end = max(times) if times else 0.0
+        self._wall0 = None
+        self._cursor = {kind: 0 for kind in self._streams}
+        self._lock = threading.Lock()
+
+    def _recorded_now(self):
+        if self._wall0 is None: self._wall0 = time.monotonic()
+        elapsed = (time.monotonic() - self._wall0) * self.speed
+        if self.loop and self._t_end > self._t0: elapsed %= (self._t_end - self._t0)
+        return self._t0 + elapsed
+
+    def _next(self, kind):
+        stream = self._streams[kind]
+        if not stream: return None
+        with self._lock:
+            if self.speed <= 0:   # step mode: every call is the next record
+                i = self._cursor[kind]
+                if i >= len(stream):
+                    if not self.loop: return None
+                    i = 0
+                self._cursor[kind] = i + 1
+                return stream[i][1]
+
+            # Timed: latest record at or before the replay clock (records are in time order) - none before the first
+            now, i = self._recorded_now(), self._cursor[kind]
+            if i and stream[i - 1][0] > now: i = 0   # clock wrapped (loop)
+            while i < len(stream) and stream[i][0] <= now: i += 1
+            self._cursor[kind] = i
+            return stream[i - 1][1] if i else None
+
+    def get_market_price(self):
+        quote = self._next("quote")
+        return quote if quote is not None else (None, "")
+
+    def get_options_chain(self):
+        chain = self._next("chain")
+        return None if chain is None else chain.copy()
+
+    def get_price_history(self):
+        closes = self._next("history")
+        return None if closes is None else closes.copy()
+
+_source = None
+_source_lock = threading.Lock()
+
+def get_source():
+    """The process-wide source for DOR_DATA_MODE."""
+    global _source
+    with _source_lock:
+        if _source is None:
+            if DATA_MODE == "replay": _source = ReplaySource()
+            elif DATA_MODE == "record": _source = RecordingSource(LiveSource())
+            else: _source = LiveSource()
+        return _source
@@ -0,0 +1,77 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
+import numpy as np
+
+# --- Progressive 3D Surface ---
+# A surface is evaluated in two passes: a coarse grid (cheap, drawn at once, bilinearly stretched to
+# the target size) and then tiles of the full grid, at-the-money first, on a thread pool (numpy
+# ufuncs release the GIL). Each finished tile is written into the same Z and handed to the caller
+# to draw; whatever is not done when the time budget runs out stays at the coarse estimate.
+
+MAX_RESOLUTION = 500
+COARSE_POINTS = 25
+TILE_POINTS = 100
+TIME_BUDGET = float(os.environ.get("DOR_SURFACE_BUDGET", "3.0"))   # seconds of refinement per draw
+REDRAW_INTERVAL = 1.0    # seconds between streamed redraws - each one remounts the chart and resets its camera
+WORKERS = min(4, os.cpu_count() or 1)
+
+_pool = None
+
+def get_pool():
+    """Shared worker pool - created on the first refinement."""
+    global _pool
+    if _pool is None: _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="surface")
+    return _pool
+
+def coarse_index(n, points=COARSE_POINTS):
+    """Evenly spread indices into an axis of n points, always including both ends."""
+    return np.unique(np.linspace(0, n - 1, min(points, n)).round().astype(int))
+
+def _stretch(Z, src, n):
+    """Linear interpolation along axis 0 from rows at indices `src` to all n rows."""
+    if len(src) == 1: return np.repeat(Z, n, axis=0)
+    pos = np.arange(n)
+    k = np.clip(np.searchsorted(src, pos, side='right') - 1, 0, len(src) - 2)
+    w = ((pos - src[k]) / (src[k + 1] - src[k]))[:, None]
+    return Z[k] * (1 - w) + Z[k + 1] * w
+
+def upsample(Z_coarse, rows, cols, ny, nx):
+    """Coarse grid sampled at (rows, cols) -> (ny, nx) by bilinear interpolation."""
+    return _stretch(_stretch(Z_coarse, rows, ny).T, cols, nx).T
+
+def tiles(ny, nx, size=TILE_POINTS):
+    """(row slice, col slice) blocks covering the grid, nearest to the centre (the spot) first."""
+    blocks = [(slice(r0, min(r0 + size, ny)), slice(c0, min(c0 + size, nx)))
+              for r0 in range(0, ny, size) for c0 in range(0, nx, size)]
+    centre = nx / 2
+    return sorted(blocks, key=lambda b: abs((b[1].start + b[1].stop) / 2 - centre))
+
+def progressive_surface(evaluate, ny, nx, budget=TIME_BUDGET, tile=TILE_POINTS, coarse=COARSE_POINTS):
+    """
+    Yields (Z, tiles_done, tiles_total) - the coarse preview first, then after every finished tile.
+    evaluate(rows, cols) gets index arrays into the y / x axes and returns a (len(rows), len(cols)) block.
+    Z is refined in place; tiles still pending when `budget` seconds have passed are dropped.
+    """
+    t0 = time.perf_counter()
+    rows, cols = coarse_index(ny, coarse), coarse_index(nx, coarse)
+    Z = upsample(evaluate(rows, cols), rows, cols, ny, nx)
+    blocks = tiles(ny, nx, tile)
+    if len(rows) == ny and len(cols) == nx:   # the coarse grid already is the full grid
+        yield Z, len(blocks), len(blocks)
+        return
+    yield Z, 0, len(blocks)
+
+    pool = get_pool()
+    futures = {pool.submit(evaluate, np.arange(ny)[rs], np.arange(nx)[cs]): (rs, cs) for rs, cs in blocks}
+    done = 0
+    try:
+        for future in as_completed(futures, timeout=max(budget - (time.perf_counter() - t0), 0.0)):
+            rs, cs = futures[future]
+            Z[rs, cs] = future.result()
+            done += 1
+            yield Z, done, len(blocks)
+    except FutureTimeout:
+        pass
+    finally:
+        for future in futures: future.cancel()   # queued tiles never start; running ones finish unseen
@@ -1,7 +1,16 @@
-from curl_cffi import requests
-import pandas as pd
-import io
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
 from datetime import datetime, timedelta
+from html.parser import HTMLParser
+import numpy as np
+import pandas as pd
+
+import maof_metrics as metrics
 
 # --- פונקציות עזר (Mock Data) ---
 def generate_mock_data():
@@ -20,51 +29,202 @@ def generate_mock_data():
     return pd.DataFrame(data)
 
 # --- Investing.com Scraper ---
-def get_investing_data():
-    print("--- מנסה למשוך נתונים מ-Investing.com ---")
-    url = "https://il.investing.com/indices/ta25-options"
-    
+# One pooled session for every fetch, raw pages cached on disk with their validators (ETag /
+# Last-Modified) and fetch time: a fresh page is served from disk, an older one is revalidated
+# with a conditional request (304 = no body), and only the options table is parsed.
+# Local fixtures: serve a saved page (python -m http.server) and point DOR_INVESTING_URL at it.
+
+INVESTING_URL = os.environ.get("DOR_INVESTING_URL", "https://il.investing.com/indices/ta25-options")
+CACHE_DIR = os.environ.get("DOR_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".dor_cache"))
+CACHE_MAX_AGE = 60       # seconds a cached page is used without asking the server
+REQUEST_TIMEOUT = 6
+
+CHAIN_COLUMNS = {'Type': 'object', 'Strike': 'float64', 'ExpirationDate': 'object', 'LastPrice': 'float64',
+                 'Bid': 'float64', 'Ask': 'float64', 'Volume': 'Int64', 'OpenInterest': 'Int64'}
+STRIKE_HEADERS = ("Strike", "מימוש")
+FIELD_ALIASES = {
+    'LastPrice': ("last", "אחרון", "שער"),
+    'Bid': ("bid", "קנייה", "ביקוש"),
+    'Ask': ("ask", "מכירה", "היצע"),
+    'Volume': ("volume", "מחזור", "נפח"),
+    'OpenInterest': ("open int", "פוזיציות", "פתוחות"),
+}
+
+_session = None
+_session_lock = threading.Lock()   # creation only - requests run concurrently (curl handle per thread)
+_cache_lock = threading.Lock()
+
+def get_session():
+    """Pooled curl_cffi session (keep-alive, browser TLS fingerprint) - created on first fetch."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                from curl_cffi import requests  # heavy - load on first fetch only
+                _session = requests.Session(impersonate="chrome")
+    return _session
+
+# --- Disk Cache (raw responses + validators) ---
+def _cache_paths(url):
+    key = hashlib.sha1(url.encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, key + ".html.gz"), os.path.join(CACHE_DIR, key + ".json")
+
+def read_cache(url):
+    body_path, meta_path = _cache_paths(url)
     try:
-        # Investing דורש User-Agent מאוד ספציפי כדי לא לחסום
-        response = requests.get(url, impersonate="chrome", timeout=15)
-        
-        if response.status_code != 200:
-            print(f"Investing חסם אותנו או שגיאה: {response.status_code}")
-            return None
-
-        # קריאת הטבלאות מה-HTML
-        # ב-Investing הטבלה מפוצלת לפעמים או שיש טבלה אחת גדולה
-        tables = pd.read_html(io.StringIO(response.text))
-        
-        df = pd.DataFrame()
-        for table in tables:
-            # מחפשים טבלה שיש בה 'סטרייק' או 'Strike' וגם מחיר
-            headers = str(table.columns)
-            if 'מימוש' in headers or 'Strike' in headers:
-                df = table
-                break
-        
-        if df.empty:
-            print("לא נמצאה טבלת אופציות ב-Investing.")
-            return None
-
-        print("--- נמצאה טבלה ב-Investing! ---")
-        # בדרך כלל ב-Investing המבנה הוא: Call Bid | Call Ask | Strike | Put Bid | Put Ask
-        # נצטרך לראות את הפלט כדי למפות, אבל נחזיר את מה שיש
-        return df
+        with open(meta_path, encoding="utf-8") as f: meta = json.load(f)
+        with gzip.open(body_path, "rt", encoding="utf-8") as f: return meta, f.read()
+    except (OSError, ValueError):
+        return None, None
+
+def write_cache(url, meta, body=None):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    body_path, meta_path = _cache_paths(url)
+    with _cache_lock:   # the .tmp names are shared by concurrent fetches of one URL
+        if body is not None:
+            with gzip.open(body_path + ".tmp", "wt", encoding="utf-8", compresslevel=5) as f: f.write(body)
+            os.replace(body_path + ".tmp", body_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f: json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
 
+def fetch_page(url=None, max_age=CACHE_MAX_AGE):
+    """(html, how) - how is 'cache', 'not-modified', 'fetched', 'stale' (server failed, old copy) or (None, 'error')."""
+    url = url or INVESTING_URL
+    meta, body = read_cache(url)
+    if body is not None and time.time() - meta.get('fetched_at', 0) < max_age:
+        return body, "cache"
+
+    headers = {}
+    if body is not None:
+        if meta.get('etag'): headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'): headers['If-Modified-Since'] = meta['last_modified']
+    try:
+        with metrics.fetch("investing") as call:
+            response = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 304 and body is not None:
+                call.ok()
+                meta['fetched_at'] = time.time()
+                write_cache(url, meta)
+                return body, "not-modified"
+            if response.status_code == 200:
+                call.ok()
+                meta = {'url': url, 'fetched_at': time.time(), 'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified')}
+                write_cache(url, meta, response.text)
+                return response.text, "fetched"
+            print(f"Investing חסם אותנו או שגיאה: {response.status_code}")
     except Exception as e:
         print(f"Investing Error: {e}")
+    return (body, "stale") if body is not None else (None, "error")
+
+# --- Targeted Table Parser ---
+def find_options_table(html):
+    """(start, end) of the <table>...</table> whose header holds a strike column - no other table is parsed."""
+    for marker in STRIKE_HEADERS:
+        pos = html.find(marker)
+        while pos != -1:
+            start = html.rfind("<table", 0, pos)
+            end = html.find("</table>", pos)
+            if start != -1 and end != -1 and html.rfind("</table>", start, pos) == -1:
+                return start, end + len("</table>")
+            pos = html.find(marker, pos + 1)
+    return None
+
+class _TableParser(HTMLParser):
+    """Rows of cell text from one table slice."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows, self._row, self._cell = [], None, None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr": self._row = []
+        elif tag in ("td", "th") and self._row is not None: self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            self._row.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if self._row: self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None: self._cell.append(data)
+
+def _to_number(values):
+    """'1,234.5' / '-' / '1.2K' -> float (NaN when empty)."""
+    s = pd.Series(values, dtype="object").astype(str).str.replace(",", "", regex=False).str.strip()
+    scale = np.select([s.str.endswith("K"), s.str.endswith("M")], [1e3, 1e6], 1.0)
+    return pd.to_numeric(s.str.rstrip("KM"), errors="coerce") * scale
+
+def _field(header):
+    h = header.lower()
+    for field, aliases in FIELD_ALIASES.items():
+        if any(a in h for a in aliases): return field
+    return None
+
+def parse_options_table(html):
+    """Side-by-side chain (calls | strike | puts) -> long DataFrame typed as CHAIN_COLUMNS."""
+    span = find_options_table(html)
+    if span is None: return None
+    parser = _TableParser()
+    parser.feed(html[span[0]:span[1]])
+    header_idx = next((i for i, row in enumerate(parser.rows) if any(m in cell for cell in row for m in STRIKE_HEADERS)), None)
+    if header_idx is None: return None
+    header = parser.rows[header_idx]
+    strike_col = next(i for i, cell in enumerate(header) if any(m in cell for m in STRIKE_HEADERS))
+    body = [row for row in parser.rows[header_idx + 1:] if len(row) == len(header)]
+    if not body: return None
+
+    cells = np.array(body, dtype=object)
+    strikes = _to_number(cells[:, strike_col]).to_numpy()
+    match = re.search(r"(\d{2}/\d{2}/\d{4})", html[max(0, span[0] - 2000):span[0]])   # expiry shown above the table
+    expiry = match.group(1) if match else None
+
+    frames = []
+    for otype, cols in (("Call", range(0, strike_col)), ("Put", range(strike_col + 1, len(header)))):
+        side = {'Type': otype, 'Strike': strikes, 'ExpirationDate': expiry}
+        for col in cols:
+            field = _field(header[col])
+            if field and field not in side: side[field] = _to_number(cells[:, col]).to_numpy()
+        if len(side) > 3: frames.append(pd.DataFrame(side))
+    if not frames: return None
+
+    df = pd.concat(frames, ignore_index=True).reindex(columns=list(CHAIN_COLUMNS))
+    df = df[np.isfinite(df['Strike'])]
+    for col, dtype in CHAIN_COLUMNS.items():
+        if dtype == 'Int64': df[col] = df[col].round().astype('Int64')
+        elif dtype == 'float64': df[col] = df[col].astype(float)
+    return df.reset_index(drop=True)
+
+def get_investing_data(url=None, max_age=CACHE_MAX_AGE):
+    print("--- מנסה למשוך נתונים מ-Investing.com ---")
+    html, how = fetch_page(url, max_age)
+    if how == "stale": metrics.fallback("chain", "stale cache")
+    if html is None: return None
+
+    df = parse_options_table(html)
+    if df is None or df.empty:
+        print("לא נמצאה טבלת אופציות ב-Investing.")
         return None
+    print(f"--- נמצאה טבלה ב-Investing! ({how}) ---")
+    return df
 
 # --- פונקציה ראשית ---
 def get_tase_options_chain():
+    """השרשרת מהמקור המוגדר - חי, מוקלט או מושמע מחדש (DOR_DATA_MODE)"""
+    import maof_sources as sources
+    return sources.get_source().get_options_chain()
+
+def fetch_options_chain():
     # 1. עדיפות ראשונה: Investing.com
     df = get_investing_data()
     if df is not None and not df.empty:
         return df
 
     # 2. כאן היה הקוד של גלובס (אפשר להשאיר או להסיר)
-    
+
     # 3. אם הכל נכשל - נתוני דמה
+    metrics.fallback("chain", "mock")
     return generate_mock_data()
\ No newline at end of file
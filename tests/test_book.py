@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+import maof_book as book
+import maof_logic as logic
+
+def legs():
+    return book.stack_portfolios({
+        "Fly": pd.DataFrame({"Type": ["Call"] * 3, "Strike": [3650, 3700, 3750], "Qty": [1, -2, 1], "Option Price": [2500, 1200, 400]}),
+        "Roll": pd.DataFrame({"Type": ["Call", "Call", "Put"], "Strike": [3700, 3700, 3600], "Qty": [2, -2, 1], "Option Price": [1200, 1300, 300]}),
+    })
+
+def test_legs_and_contracts_mean_the_same_in_every_row():
+    df = book.book_risk(legs(), 3700.0, 30 / 365, 0.04, 0.16, 50).set_index("Portfolio")
+    assert df.loc["Fly", "Legs"] == 3 and df.loc["Fly", "Contracts"] == 3
+    assert df.loc["Roll", "Legs"] == 3 and df.loc["Roll", "Contracts"] == 1    # the 3700 call nets out
+    assert df.loc[book.BOOK_ROW, "Legs"] == 6
+    assert df.loc[book.BOOK_ROW, "Contracts"] == 4                            # 3650C, 3700C (-2 +0), 3750C, 3600P
+
+def test_book_row_is_the_sum_of_its_portfolios():
+    df = book.book_risk(legs(), 3700.0, 30 / 365, 0.04, 0.16, 50).set_index("Portfolio")
+    parts, net = df.drop(book.BOOK_ROW), df.loc[book.BOOK_ROW]
+    for col in ['Cost', 'PnL', 'Delta', 'Gamma', 'Theta', 'Vega']:
+        assert np.isclose(parts[col].sum(), net[col])
+
+def test_net_positions():
+    net = book.net_positions(legs()).set_index(["Type", "Strike"])
+    assert net.loc[("Call", 3700), "Qty"] == -2
+    assert net.loc[("Call", 3700), "Total Cost"] == -2 * 1200 + 2 * 1200 - 2 * 1300
+    assert len(net) == len(logic.build_book_matrix(legs())['strike'])
@@ -0,0 +1,56 @@
+from datetime import date, time
+import numpy as np
+import pytest
+
+import maof_calendar as tase_calendar
+
+@pytest.fixture(scope="module")
+def cal():
+    return tase_calendar.TradingCalendar(tase_calendar.load_calendar_spec(), start=date(2026, 1, 1))
+
+def test_sessions_and_holidays(cal):
+    assert cal.session(date(2026, 9, 14)) == (time(10, 0), time(17, 40))    # Monday
+    assert cal.session(date(2026, 9, 18)) == (time(10, 0), time(14, 0))     # Friday: short session
+    assert cal.session(date(2026, 9, 19)) is None                           # Saturday
+    assert not cal.is_trading_day(date(2026, 9, 21))                        # Yom Kippur
+    assert not cal.is_trading_day(date(2026, 9, 25))                        # Sukkot Eve, a Friday
+
+def test_overnight_gap_skips_closed_days(cal):
+    assert cal.overnight_gap_hours(date(2026, 9, 14)) == pytest.approx(16 + 20 / 60)   # Mon 17:40 -> Tue 10:00
+    assert cal.overnight_gap_hours(date(2026, 9, 18)) == pytest.approx(92.0)           # Fri 14:00 -> Tue 10:00 (Yom Kippur Monday)
+    assert cal.overnight_gap_hours(date(2026, 9, 26)) == cal.overnight_gap_hours(date(2026, 9, 24))   # Saturday: from Thursday's close
+
+def test_monthly_expiry_rolls_back_to_a_trading_day(cal):
+    assert cal.monthly_expiry(2026, 5) == date(2026, 5, 29)     # last Friday
+    assert cal.monthly_expiry(2026, 9) == date(2026, 9, 24)     # last Friday is Sukkot Eve -> Thursday
+    assert cal.default_expiry(today=date(2026, 9, 25)) == date(2026, 10, 30)
+
+def test_upcoming_expiries(cal):
+    assert cal.upcoming_expiries(today=date(2026, 9, 14), weeks=4) == [
+        (date(2026, 9, 18), "Weekly"), (date(2026, 9, 24), "Monthly"),
+        (date(2026, 10, 1), "Weekly"),   # Simchat Torah Eve Friday -> Thursday
+        (date(2026, 10, 9), "Weekly")]
+
+def test_trading_days_ahead(cal):
+    # Sun 20 Sep: Yom Kippur, Tue-Thu, Sukkot Eve, weekend -> 3 trading days in a week
+    assert cal.trading_days_ahead(7, today=date(2026, 9, 20)) == 3.0
+    assert np.allclose(cal.trading_days_ahead([7, 10.5], today=date(2026, 9, 20)), [3.0, 6.5])
+
+def test_session_days_left(cal):
+    assert cal.session_days_left(time(13, 50), time(17, 40), d=date(2026, 9, 14)) == pytest.approx(230 / 460)
+    assert cal.session_days_left(time(12, 0), time(14, 0), d=date(2026, 9, 18)) == pytest.approx(0.5)    # Friday: 4h session
+    assert cal.session_days_left(time(12, 0), time(14, 0), d=date(2026, 9, 19)) == pytest.approx(2 / (7 + 2 / 3))   # Saturday: next is Tuesday
+    assert cal.session_days_left(time(18, 0), time(17, 40), d=date(2026, 9, 14)) == 0.0
+
+def test_year_fraction_basis(cal):
+    today = date(2026, 9, 20)
+    assert cal.year_fraction_days(7, basis=365, today=today) == pytest.approx(7 / 365)
+    assert cal.year_fraction_days(7, basis=252, today=today) == pytest.approx(3 / 252)
+    assert np.allclose(cal.year_fraction_days(np.array([0, 7]), basis=252, today=today), [tase_calendar.MIN_T, 3 / 252])
+
+def test_year_fraction_intraday(cal):
+    gap = cal.overnight_gap_hours(date(2026, 9, 14))
+    T = cal.year_fraction_intraday(time(15, 40), time(17, 40), gap, basis=365)
+    assert T == pytest.approx((2 + gap) / (365 * 24))
+    half = cal.year_fraction_intraday(time(15, 40), time(17, 40), gap, basis=365, progress=0.5)
+    assert half == pytest.approx((1 + gap) / (365 * 24))
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+import maof_explain as explain
+
+MULT = 50
+START = explain.MarketState(3700.0, 30 / 365, 0.04, 0.16)
+
+def book():
+    a = pd.DataFrame({"Type": ["Call", "Put"], "Strike": [3700, 3650], "Qty": [1, -2], "Option Price": [3000, 1500]})
+    b = pd.DataFrame({"Type": ["Call", "Call"], "Strike": [3750, 3800], "Qty": [-1, 1], "Option Price": [1200, 600]})
+    return [a, b]
+
+def test_terms_and_residual_add_up_to_actual():
+    snapshot = explain.take_snapshot(book(), START, MULT)
+    end = explain.MarketState(3790.0, 22 / 365, 0.045, 0.19)
+    df = explain.explain_pnl(snapshot, end)
+    assert list(df.index) == ["Portfolio 1", "Portfolio 2"]
+    assert np.allclose(df[explain.TERMS].sum(axis=1) + df['Residual'], df['Actual'])
+    assert np.allclose(df['End'] - df['Start'], df['Actual'])
+
+def test_small_spot_move_is_explained():
+    snapshot = explain.take_snapshot(book(), START, MULT, ["A", "B"])
+    df = explain.explain_pnl(snapshot, START._replace(spot=3705.0))
+    assert (df['Actual'].abs() > 10).all()
+    assert (df['Residual'].abs() < 1e-3 * df['Actual'].abs() + 0.05).all()   # third order in a 5-point move
+    assert np.allclose(df[['Theta', 'Vega']], 0.0)
+
+def test_time_and_vol_terms():
+    snapshot = explain.take_snapshot(book(), START, MULT)
+    one_day = explain.explain_pnl(snapshot, START._replace(T=START.T - 1 / 365))
+    assert np.allclose(one_day[['Delta', 'Gamma', 'Vega']], 0.0)
+    assert (one_day['Residual'].abs() < 0.05 * one_day['Actual'].abs()).all()
+    vol_up = explain.explain_pnl(snapshot, START._replace(vol=START.vol + 0.005))
+    assert (vol_up['Residual'].abs() < 0.05 * vol_up['Actual'].abs()).all()
+
+def test_empty_book():
+    snapshot = explain.take_snapshot([pd.DataFrame(columns=["Type", "Strike", "Qty", "Option Price"])], START, MULT)
+    df = explain.explain_pnl(snapshot, START._replace(spot=3800.0))
+    assert (df.to_numpy() == 0).all() and list(df.columns)[-2:] == ['Explained', 'Residual']
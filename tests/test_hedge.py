@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import maof_hedge as hedge
+
+def history(n=500, mu=0.002, sigma=0.01, seed=0):
+    returns = np.random.default_rng(seed).normal(mu, sigma, n)
+    return 3700.0 * np.exp(np.concatenate([[0.0], np.cumsum(returns)])), returns
+
+def test_bootstrap_keeps_daily_drift_and_variance():
+    closes, returns = history()
+    days = 5
+    paths = hedge.bootstrap_paths(closes, 3700.0, 20000, days * hedge.STEPS_PER_DAY, seed=1)
+    day_returns = np.diff(np.log(paths[:, ::hedge.STEPS_PER_DAY]), axis=1)
+    assert day_returns.shape == (20000, days)
+    assert np.isclose(day_returns.mean(), returns.mean(), atol=2e-4)
+    assert np.isclose(day_returns.std(), returns.std(), rtol=0.03)
+
+def test_bootstrap_needs_history():
+    closes, _ = history(n=10)
+    with pytest.raises(ValueError): hedge.bootstrap_paths(closes, 3700.0, 10, 8)
+
+def test_schedules_count_trading_steps():
+    assert hedge.FREQUENCIES['Daily'] == hedge.STEPS_PER_DAY
+    assert hedge.FREQUENCIES['Weekly'] == 5 * hedge.FREQUENCIES['Daily']
+
+def test_hedging_cuts_the_spread():
+    df = pd.DataFrame({"Type": ["Call"], "Strike": [3700], "Qty": [1], "Option Price": [60.0]})
+    paths = hedge.gbm_paths(3700.0, 20 / 252, 0.15, 0.04, 2000, 20 * hedge.STEPS_PER_DAY, seed=2)
+    results = hedge.simulate_hedging(df, paths, 20 / 252, 0.04, 0.15, 50, tc_bps=0.0)
+    assert results['Hourly']['Hedged'].std() < results['Weekly']['Hedged'].std() < results['Unhedged']['Hedged'].std()
+    assert results['Daily']['Rebalances'][0] == 20
@@ -0,0 +1,102 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+import maof_live as live
+import maof_logic as logic
+
+LEGS = pd.DataFrame({"Type": ["Call", "Call"], "Strike": [3700, 3750], "Qty": [1, -1], "Option Price": [2500, 1000]})
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline: raise AssertionError("timed out")
+        time.sleep(0.005)
+
+@pytest.fixture
+def feed():
+    f = live.MarketFeed(live.StubSource(seed=0), interval=0.01, queue_size=4)
+    yield f
+    f.stop()
+
+def test_stub_source_is_a_seeded_random_walk():
+    a, b = live.StubSource(seed=1), live.StubSource(seed=1)
+    prices = [a()[0] for _ in range(5)]
+    assert prices == [b()[0] for _ in range(5)]
+    assert len(set(prices)) == 5 and all(abs(p / 3700 - 1) < 0.01 for p in prices)
+    assert a()[1] == "Stub"
+
+def test_full_queue_drops_oldest_ticks(feed):
+    q = feed.subscribe()
+    for i in range(10): feed._publish(live.Tick(float(i), 3700.0 + i, "Stub"))
+    assert q.qsize() == feed.queue_size
+    assert feed.dropped == 10 - feed.queue_size
+    assert [q.get_nowait().price for _ in range(q.qsize())] == [3706.0, 3707.0, 3708.0, 3709.0]
+
+def test_consumer_poll_returns_latest_tick(feed):
+    consumer = live.LiveConsumer(feed)
+    for i in range(6): feed._publish(live.Tick(float(i), 3700.0 + i, "Stub"))
+    assert consumer.poll().price == 3705.0
+    assert consumer.skipped == feed.queue_size - 1
+    # Nothing new: the last tick is kept, the spot follows it
+    assert consumer.poll().price == 3705.0
+    assert consumer.spot(3600.0) == 3705.0
+    consumer.close()
+
+def test_consumer_spot_falls_back_before_first_tick(feed):
+    assert live.LiveConsumer(feed).spot(3600.0) == 3600.0
+
+def test_new_subscriber_gets_last_tick(feed):
+    feed._publish(live.Tick(1.0, 3711.0, "Stub"))
+    assert feed.subscribe().get_nowait().price == 3711.0
+
+def test_feed_polls_only_with_subscribers(feed):
+    feed.start()
+    time.sleep(0.1)
+    assert feed.polls == 0
+
+    consumer = live.LiveConsumer(feed)
+    wait_for(lambda: feed.polls >= 3)
+    tick = consumer.poll()
+    assert tick is not None and tick.source == "Stub"
+    assert feed.stats()['Subscribers'] == 1 and feed.stats()['Failures'] == 0
+
+    consumer.close()
+    polls = feed.polls
+    time.sleep(0.1)
+    assert feed.polls <= polls + 1   # at most the poll already in flight
+
+def test_slow_consumer_catches_up_to_newest(feed):
+    feed.start()
+    consumer = live.LiveConsumer(feed)
+    wait_for(lambda: feed.dropped > 0)   # consumer never drained - backlog was capped
+    assert consumer.queue.qsize() <= feed.queue_size
+    tick = consumer.poll()
+    assert tick.ts >= feed.last_tick.ts - 1.0 and consumer.queue.empty()
+
+def test_failing_source_counts_failures():
+    def broken(): raise ConnectionError("down")
+    feed = live.MarketFeed(broken, interval=0.01).start()
+    consumer = live.LiveConsumer(feed)
+    wait_for(lambda: feed.failures >= 2)
+    feed.stop()
+    assert feed.last_tick is None and consumer.poll() is None
+
+def test_closed_session_queue_is_released(feed):
+    live.LiveConsumer(feed)   # dropped at once - the weak subscriber set lets it go
+    assert feed.stats()['Subscribers'] == 0
+
+def test_portfolio_greeks_match_engine_and_cache_per_state(feed):
+    consumer = live.LiveConsumer(feed)
+    greeks = consumer.portfolio_greeks([LEGS], 3710.0, 30 / 365, 0.0425, 0.14, 50)
+    expected = logic.calculate_portfolios_greeks([LEGS], 3710.0, 30 / 365, 0.0425, 0.14, 50)
+    assert np.isclose(greeks[0]['PnL'], expected[0]['PnL']) and np.isclose(greeks[0]['Delta'], expected[0]['Delta'])
+    assert consumer.portfolio_greeks([LEGS], 3710.0, 30 / 365, 0.0425, 0.14, 50) is greeks
+    assert consumer.portfolio_greeks([LEGS], 3711.0, 30 / 365, 0.0425, 0.14, 50) is not greeks
+
+def test_chain_window_stays_in_the_session(feed):
+    consumer = live.LiveConsumer(feed)
+    df, total = consumer.chain_window(3700.0, [("x", 0.05)], 0.0425, 0.14, 50, 10, 20, 0, 10)
+    assert total == 21 and len(df) == 10 and df['Strike'].iloc[0] == 3600
+    assert consumer._chains.stats()['States'] == 1
@@ -0,0 +1,56 @@
+import pytest
+
+import maof_metrics as metrics
+
+@pytest.fixture(autouse=True)
+def clean():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def test_render_exposition_format():
+    metrics.inc('dor_fetch_total', source="tase_api", outcome="success")
+    metrics.set_gauge('dor_fetch_last_success_seconds', 1700000000, source="tase_api")
+    metrics.observe('dor_fetch_seconds', 0.3, source="tase_api")
+    lines = metrics.render().splitlines()
+
+    assert lines[:3] == ['# HELP dor_fetch_last_success_seconds Unix time of the last successful fetch',
+                         '# TYPE dor_fetch_last_success_seconds gauge',
+                         'dor_fetch_last_success_seconds{source="tase_api"} 1700000000']
+    assert '# TYPE dor_fetch_seconds histogram' in lines
+    assert 'dor_fetch_seconds_bucket{source="tase_api",le="0.25"} 0' in lines
+    assert 'dor_fetch_seconds_bucket{source="tase_api",le="0.5"} 1' in lines
+    assert 'dor_fetch_seconds_bucket{source="tase_api",le="+Inf"} 1' in lines
+    assert 'dor_fetch_seconds_sum{source="tase_api"} 0.3' in lines
+    assert 'dor_fetch_seconds_count{source="tase_api"} 1' in lines
+    assert lines[-3:] == ['# HELP dor_fetch_total Data source fetches by outcome', '# TYPE dor_fetch_total counter',
+                          'dor_fetch_total{outcome="success",source="tase_api"} 1']
+
+def test_histogram_buckets_are_cumulative():
+    for v in (0.0002, 0.003, 0.003, 20.0): metrics.observe('dor_pricing_seconds', v, metrics.PRICING_BUCKETS, op="chain_rows")
+    lines = metrics.render().splitlines()
+    buckets = [l for l in lines if l.startswith('dor_pricing_seconds_bucket')]
+    assert len(buckets) == len(metrics.PRICING_BUCKETS) + 1
+    counts = [int(l.rsplit(" ", 1)[1]) for l in buckets]
+    assert counts == sorted(counts) and counts[0] == 1 and counts[2] == 3 and counts[-1] == 4   # 20s only in +Inf
+    assert buckets[-1].startswith('dor_pricing_seconds_bucket{op="chain_rows",le="+Inf"}')
+
+def test_timed_and_fetch_helpers():
+    @metrics.timed("unit_op")
+    def work(x): return x * 2
+    assert work(21) == 42
+
+    with metrics.fetch("yahoo") as call: call.ok()
+    with pytest.raises(ConnectionError):
+        with metrics.fetch("yahoo"): raise ConnectionError("down")
+
+    snap = metrics.snapshot()
+    assert snap[('dor_fetch_total', (('outcome', 'success'), ('source', 'yahoo')))] == 1
+    assert snap[('dor_fetch_total', (('outcome', 'failure'), ('source', 'yahoo')))] == 1
+    text = metrics.render()
+    assert 'dor_pricing_seconds_count{op="unit_op"} 1' in text
+    assert 'dor_fetch_last_success_seconds{source="yahoo"}' in text
+
+def test_label_values_are_escaped():
+    metrics.inc('dor_fallback_total', feed='chain', served_by='a "quoted"\nname')
+    assert 'dor_fallback_total{feed="chain",served_by="a \\"quoted\\"\\nname"} 1' in metrics.render()
@@ -0,0 +1,63 @@
+import io
+import pandas as pd
+import pytest
+
+import maof_portfolios as portfolios
+
+def legs(*rows):
+    return pd.DataFrame(rows, columns=portfolios.LEG_COLUMNS)
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "portfolios.db")
+
+def test_save_load_round_trip(db):
+    df = legs(["Call", 3700, 2, 3000], ["Put", 3650, -1, 1500])
+    pid = portfolios.save_portfolio(" Iron ", df, tags="income, weekly", db_path=db)
+    loaded = portfolios.load_portfolio("Iron", db_path=db)
+    pd.testing.assert_frame_equal(loaded, df.astype({"Strike": int, "Qty": int, "Option Price": int}))
+
+    # Saving under the same name replaces the legs and keeps the id
+    assert portfolios.save_portfolio("Iron", df.head(1), db_path=db) == pid
+    assert len(portfolios.load_portfolio("Iron", db_path=db)) == 1
+    assert portfolios.load_portfolio("missing", db_path=db).empty
+
+def test_empty_name_is_rejected(db):
+    with pytest.raises(ValueError): portfolios.save_portfolio("  ", legs(), db_path=db)
+
+def test_tag_filtering(db):
+    portfolios.save_portfolio("A", legs(["Call", 3700, 1, 100]), tags="weekly, income", db_path=db)
+    portfolios.save_portfolio("B", legs(["Put", 3600, 1, 50], ["Put", 3500, -1, 20]), tags="hedge", db_path=db)
+    portfolios.save_portfolio("C", legs(["Call", 3800, -1, 40]), tags=["income"], db_path=db)
+
+    assert portfolios.list_tags(db_path=db) == ["hedge", "income", "weekly"]
+    assert sorted(portfolios.list_portfolios(tag="income", db_path=db)["Name"]) == ["A", "C"]
+    listed = portfolios.list_portfolios(db_path=db).set_index("Name")
+    assert listed.loc["B", "Legs"] == 2 and listed.loc["A", "Tags"] == "income,weekly"
+
+    book = portfolios.load_portfolios(tag="income", db_path=db)
+    assert book["Portfolio"].tolist() == ["A", "C"]
+    assert portfolios.load_portfolios(names=["A", "B"], tag="income", db_path=db)["Portfolio"].tolist() == ["A"]
+
+    portfolios.delete_portfolio("C", db_path=db)
+    assert portfolios.list_portfolios(tag="income", db_path=db)["Name"].tolist() == ["A"]
+
+def test_csv_round_trip(db, tmp_path):
+    csv = ("Portfolio,Type,Strike,Qty,Option Price,Tags\n"
+           "Fly,Call,3650,1,2500,\"fly, weekly\"\n"
+           "Fly,Call,3700,-2,1200,\"fly, weekly\"\n"
+           "Fly,Call,3750,1,400,\"fly, weekly\"\n"
+           "Hedge,Put,3500,3,300,\n")
+    assert portfolios.import_csv(io.StringIO(csv), db_path=db) == 2
+    assert portfolios.list_tags(db_path=db) == ["fly", "weekly"]
+    assert portfolios.load_portfolio("Fly", db_path=db)["Qty"].tolist() == [1, -2, 1]
+
+    exported = portfolios.export_csv(db_path=db)
+    other = str(tmp_path / "other.db")
+    assert portfolios.import_csv(io.StringIO(exported), db_path=other) == 2
+    assert portfolios.export_csv(db_path=other) == exported
+    assert portfolios.export_csv(names=["Hedge"], db_path=db).splitlines()[1:] == ["Hedge,Put,3500,3,300,"]
+
+def test_csv_missing_columns(db):
+    with pytest.raises(ValueError, match="Option Price"):
+        portfolios.import_csv(io.StringIO("Portfolio,Type,Strike,Qty\nX,Call,3700,1\n"), db_path=db)
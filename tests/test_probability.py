@@ -0,0 +1,63 @@
+import math
+import numpy as np
+import pandas as pd
+
+import maof_logic as logic
+import maof_probability as probability
+
+SPOT, T, R, VOL, MULT = 3700.0, 30 / 365, 0.04, 0.18, 50
+
+def legs(*rows):
+    return pd.DataFrame(rows, columns=["Type", "Strike", "Qty", "Option Price"])
+
+def n_d2(K, vol=VOL):
+    return logic.norm_cdf((math.log(SPOT / K) + (R - 0.5 * vol**2) * T) / (vol * math.sqrt(T)))
+
+def terminal(n=400000, seed=7):
+    z = np.random.default_rng(seed).standard_normal(n)
+    return SPOT * np.exp((R - 0.5 * VOL**2) * T + VOL * math.sqrt(T) * z)
+
+def test_free_long_call_pop_is_itm_probability():
+    res = probability.probability_analytics([legs(["Call", 3750, 1, 0])], SPOT, T, R, VOL, MULT)
+    assert np.isclose(res['POP'][0], n_d2(3750))
+    # Expected payoff = the forward value of the call
+    call = logic.bs_calc_raw(SPOT, 3750.0, T, R, VOL, 'call')[0]
+    assert np.isclose(res['ExpectedPnL'][0], call * math.exp(R * T) * MULT)
+
+def test_paid_call_breakeven_and_pop():
+    premium = 40.0
+    res = probability.probability_analytics([legs(["Call", 3700, 1, premium * MULT])], SPOT, T, R, VOL, MULT)
+    assert np.allclose(res['Breakevens'][0], [3700 + premium])
+    assert np.isclose(res['POP'][0], n_d2(3700 + premium))
+
+def test_spread_matches_monte_carlo():
+    spread = legs(["Put", 3600, 1, 30 * MULT], ["Put", 3700, -1, 60 * MULT], ["Call", 3800, -1, 25 * MULT])
+    res = probability.probability_analytics([spread], SPOT, T, R, VOL, MULT)
+    S = terminal()
+    pnl = (np.maximum(3600 - S, 0) - np.maximum(3700 - S, 0) - np.maximum(S - 3800, 0)) * MULT - (30 - 60 - 25) * MULT
+    assert abs(res['POP'][0] - (pnl > 0).mean()) < 0.005
+    assert abs(res['ExpectedPnL'][0] - pnl.mean()) < 4 * pnl.std() / math.sqrt(len(pnl))
+
+def test_vol_levels_broadcast():
+    book = [legs(["Call", 3750, 1, 0]), legs(["Put", 3650, 1, 0])]
+    vols = np.array([0.1, 0.2, 0.3])
+    res = probability.probability_analytics(book, SPOT, T, R, vols, MULT)
+    assert res['POP'].shape == (3, 2) and res['ExpectedPnL'].shape == (3, 2)
+    assert np.allclose(res['POP'][:, 0], [n_d2(3750, v) for v in vols])
+    assert np.all(np.diff(res['ExpectedPnL'], axis=0) > 0)   # long options gain from vol
+
+def test_touch_probability_matches_simulated_paths():
+    n_paths, n_steps = 20000, 2000
+    rng = np.random.default_rng(3)
+    dt = T / n_steps
+    log_paths = np.cumsum(rng.standard_normal((n_paths, n_steps), dtype=np.float32) * np.float32(VOL * math.sqrt(dt)) + np.float32((R - 0.5 * VOL**2) * dt), axis=1)
+    for level in (3800.0, 3550.0):
+        m = math.log(level / SPOT)
+        hit = (log_paths.max(axis=1) >= m) if m > 0 else (log_paths.min(axis=1) <= m)
+        # Discrete monitoring misses some crossings - the closed form is the continuous limit
+        assert 0 <= probability.touch_probability(level, SPOT, T, R, VOL) - hit.mean() < 0.03
+
+def test_touch_probability_edges():
+    assert probability.touch_probability(SPOT, SPOT, T, R, VOL) == 1.0
+    assert abs(probability.touch_probability(3800.0, SPOT, T, R, VOL) - 2 * n_d2(3800)) < 0.03   # reflection: about twice the expiry chance
+    assert np.isnan(probability.touch_probability(np.inf, SPOT, T, R, VOL))
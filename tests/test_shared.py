@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+import maof_live as live
+import maof_shared as shared
+
+def portfolio(n):
+    return shared.compact_portfolio(pd.DataFrame({"Type": ["Call"] * n, "Strike": [3700] * n, "Qty": [1] * n, "Option Price": [100] * n}))
+
+def test_nested_results_are_counted():
+    edges = np.zeros(61, dtype=np.float32)
+    view = ("A", 10000, 72, pd.DataFrame({'x': np.zeros(1000)}), edges, {'Daily': np.zeros(60, dtype=np.int32)})
+    assert shared.object_nbytes(view) > 8000 + edges.nbytes + 240
+
+def test_chain_store_share_and_market_key():
+    store = shared.SharedMarketStore(max_states=2)
+    a, _ = store.get_chain_window(3700.0, [("x", 0.05)], 0.04, 0.15, 50, 10, 20, 0, 10)
+    b, _ = store.get_chain_window(3700.004, [("x", 0.05)], 0.04, 0.15, 50, 10, 20, 0, 10)
+    assert a.equals(b) and store.stats()['Hits'] == 1
+    for spot in (3600.0, 3650.0): store.get_chain_window(spot, [("x", 0.05)], 0.04, 0.15, 50, 10, 20, 0, 10)
+    assert store.stats()['States'] == 2
+    store.clear()
+    assert store.stats()['States'] == 0
+
+def test_over_limit_drops_derived_results_first():
+    session = {'portfolio_a': portfolio(50), 'hedge_view': ("A", np.zeros(4000)), 'explain_snapshot': {'price': np.zeros(1000)}}
+    limit = shared.object_nbytes(session['portfolio_a']) + 10000
+    total, released = shared.enforce_session_limit(session, limit)
+    assert released == ['hedge_view'] and total <= limit
+    assert 'portfolio_a' in session and 'explain_snapshot' in session
+
+def test_under_limit_keeps_everything():
+    session = {'portfolio_a': portfolio(5), 'hedge_view': ("A", np.zeros(10))}
+    assert shared.enforce_session_limit(session)[1] == [] and len(session) == 2
+
+def test_live_chains_are_shrunk():
+    feed = live.MarketFeed(live.StubSource(seed=0))
+    consumer = live.LiveConsumer(feed)
+    for spot in (3700.0, 3701.0, 3702.0): consumer.chain_window(spot, [("x", 0.05)], 0.04, 0.15, 50, 10, 200, 0, 50)
+    session = {'portfolio_a': portfolio(5), 'live_consumer': consumer}
+    assert shared.object_nbytes(consumer) > 0
+    total, released = shared.enforce_session_limit(session, shared.object_nbytes(session['portfolio_a']) + 1000)
+    assert released == ['live_consumer'] and session['live_consumer'] is consumer
+    assert consumer.session_nbytes() == 0
+
+def test_oversized_result_is_refused():
+    session = {'portfolio_a': portfolio(5), 'explain_snapshot': {'price': np.zeros(500)}}
+    assert not shared.store_result(session, 'hedge_view', ("A", np.zeros(2_000_000)))
+    assert 'hedge_view' not in session
+    assert shared.store_result(session, 'hedge_view', ("A", np.zeros(100)))
+    assert session['hedge_view'][1].shape == (100,)
@@ -0,0 +1,103 @@
+import gzip
+import os
+import numpy as np
+import pandas as pd
+
+import maof_sources as sources
+import tase_data
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "investing_options.html")
+
+class FakeSource:
+    name = "Fake"
+
+    def __init__(self):
+        self.prices = iter([3700.0, 3701.5, None, 3703.0])
+
+    def get_market_price(self):
+        price = next(self.prices)
+        return price, "Fake" if price is not None else ""
+
+    def get_options_chain(self):
+        with open(FIXTURE, encoding="utf-8") as f: return tase_data.parse_options_table(f.read())
+
+    def get_price_history(self):
+        return np.linspace(3000.0, 3700.0, 30)
+
+def record(path):
+    recorder = sources.RecordingSource(FakeSource(), path=str(path))
+    quotes = [recorder.get_market_price() for _ in range(4)]
+    chain = recorder.get_options_chain()
+    closes = recorder.get_price_history()
+    recorder.close()
+    return recorder, quotes, chain, closes
+
+def test_recording_round_trip(tmp_path):
+    path = tmp_path / "rec.jsonl.gz"
+    recorder, quotes, chain, closes = record(path)
+    assert recorder.records == 5   # the failed quote is not recorded
+    recorded_quotes, chains, history = sources.load_recording(str(path))
+    assert recorded_quotes['price'].tolist() == [3700.0, 3701.5, 3703.0]
+    assert len(history) == 1 and np.array_equal(history[0][1], closes)
+    assert len(chains) == 1
+    pd.testing.assert_frame_equal(chains[0][1], chain)   # dtypes and missing values survive the JSON
+
+def test_step_replay_serves_records_in_order(tmp_path):
+    path = tmp_path / "rec.jsonl.gz"
+    record(path)
+    replay = sources.ReplaySource(str(path), speed=0)
+    assert [replay.get_market_price() for _ in range(4)] == [(3700.0, "Fake"), (3701.5, "Fake"), (3703.0, "Fake"), (None, "")]
+    closes = replay.get_price_history()
+    assert len(closes) == 30 and closes[-1] == 3700.0
+    assert replay.get_price_history() is None
+    replayed = replay.get_options_chain()
+    assert str(replayed['Volume'].dtype) == 'Int64' and replayed['Volume'].isna().sum() == 1
+    assert replay.get_options_chain() is None
+
+def test_replay_without_history_stays_offline(tmp_path):
+    path = tmp_path / "quotes.jsonl.gz"
+    recorder = sources.RecordingSource(FakeSource(), path=str(path))
+    recorder.get_market_price()
+    recorder.close()
+    assert sources.ReplaySource(str(path), speed=0).get_price_history() is None
+
+def test_torn_tail_is_ignored(tmp_path):
+    path = tmp_path / "rec.jsonl.gz"
+    record(path)
+    with gzip.open(path, "at", encoding="utf-8") as f: f.write('{"t": 1, "kind": "quo')
+    quotes, chains, history = sources.load_recording(str(path))
+    assert len(quotes) == 3 and len(chains) == 1 and len(history) == 1
+
+def write_records(path, records):
+    recorder = sources.RecordingSource(None, path=str(path))
+    for record in records: recorder._write(record)
+    recorder.close()
+
+def test_timed_replay_waits_for_the_recorded_clock(tmp_path, monkeypatch):
+    path = tmp_path / "timed.jsonl.gz"
+    write_records(path, [{"t": 100.0, "kind": "quote", "price": 3700.0, "source": "Fake"},
+                         {"t": 105.0, "kind": "chain", "columns": ["Type", "Strike"], "data": [["Call", 3700]]},
+                         {"t": 110.0, "kind": "quote", "price": 3710.0, "source": "Fake"}])
+    clock = [0.0]
+    monkeypatch.setattr(sources.time, "monotonic", lambda: clock[0])
+    replay = sources.ReplaySource(str(path), speed=1)
+    assert replay.get_market_price() == (3700.0, "Fake")
+    assert replay.get_options_chain() is None   # recorded 5s in - not reached yet
+    clock[0] = 6.0
+    assert replay.get_options_chain()['Strike'].tolist() == [3700.0]
+    assert replay.get_market_price() == (3700.0, "Fake")
+    clock[0] = 10.0
+    assert replay.get_market_price() == (3710.0, "Fake")
+
+def test_looped_replay_starts_over(tmp_path):
+    path = tmp_path / "loop.jsonl.gz"
+    write_records(path, [{"t": 1.0, "kind": "quote", "price": p, "source": "Fake"} for p in (1.0, 2.0)])
+    assert sources.ReplaySource(str(path), speed=0).loop == sources.REPLAY_LOOP
+    replay = sources.ReplaySource(str(path), speed=0, loop=True)
+    assert [replay.get_market_price()[0] for _ in range(5)] == [1.0, 2.0, 1.0, 2.0, 1.0]
+
+def test_chain_entry_point_uses_the_configured_source(monkeypatch, tmp_path):
+    path = tmp_path / "rec.jsonl.gz"
+    _, _, chain, _ = record(path)
+    monkeypatch.setattr(sources, "_source", sources.ReplaySource(str(path), speed=0))
+    pd.testing.assert_frame_equal(tase_data.get_tase_options_chain(), chain)
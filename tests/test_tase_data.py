@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+import tase_data
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "investing_options.html")
+ETAG = '"chain-v1"'
+
+@pytest.fixture(scope="module")
+def page():
+    with open(FIXTURE, encoding="utf-8") as f: return f.read()
+
+@pytest.fixture
+def server(page):
+    """Local stand-in for Investing: 200 with an ETag, 304 when the client sends it back."""
+    seen, delay = [], []   # delay: seconds to hold each response (set by a test)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            seen.append(self.headers.get('If-None-Match'))
+            if delay: time.sleep(delay[0])
+            if self.headers.get('If-None-Match') == ETAG:
+                self.send_response(304)
+                self.send_header("ETag", ETAG)
+                self.end_headers()
+                return
+            body = page.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    httpd.delay = delay
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/ta25-options", seen, httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tase_data, "CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+# --- Parser ---
+def test_find_options_table_skips_other_tables(page):
+    start, end = tase_data.find_options_table(page)
+    table = page[start:end]
+    assert table.startswith('<table class="genTbl optionsTbl"') and table.endswith("</table>")
+    assert "TA 35</td>" not in table and "TA 125" not in table
+
+def test_find_options_table_without_chain():
+    assert tase_data.find_options_table("<table><tr><td>Last</td></tr></table>") is None
+    assert tase_data.parse_options_table("<html><body>no tables</body></html>") is None
+
+def test_parse_options_table(page):
+    df = tase_data.parse_options_table(page)
+    assert list(df.columns) == list(tase_data.CHAIN_COLUMNS)
+    numeric = {col: dtype for col, dtype in tase_data.CHAIN_COLUMNS.items() if dtype != 'object'}
+    assert {col: str(df[col].dtype) for col in numeric} == numeric
+    assert all(isinstance(v, str) for v in df['Type']) and all(isinstance(v, str) for v in df['ExpirationDate'])
+    assert len(df) == 8 and df['Type'].value_counts().to_dict() == {'Call': 4, 'Put': 4}
+    assert (df['ExpirationDate'] == "25/11/2026").all()
+
+    calls = df[df['Type'] == 'Call'].set_index('Strike')
+    puts = df[df['Type'] == 'Put'].set_index('Strike')
+    assert calls.index.tolist() == [3600.0, 3650.0, 3700.0, 3750.0]
+    assert calls.loc[3600.0, 'LastPrice'] == 142.5 and calls.loc[3600.0, 'Volume'] == 1200
+    assert calls.loc[3650.0, 'OpenInterest'] == 6002
+    assert puts.loc[3700.0, 'Bid'] == 55.0 and puts.loc[3700.0, 'Volume'] == 2100
+    # '-' is a missing value, not a zero
+    assert calls['LastPrice'].isna().sum() == 1 and calls['Volume'].isna().sum() == 1
+
+# --- Fetch + Disk Cache ---
+def test_fetch_revalidates_with_etag(server, page):
+    url, seen, _ = server
+    assert tase_data.fetch_page(url, max_age=0) == (page, "fetched")
+    meta, body = tase_data.read_cache(url)
+    assert body == page and meta['etag'] == ETAG
+
+    # Expired copy: a conditional request, 304 without a body, the cached page is served
+    assert tase_data.fetch_page(url, max_age=0) == (page, "not-modified")
+    assert seen == [None, ETAG]
+    assert tase_data.read_cache(url)[0]['fetched_at'] > meta['fetched_at']
+
+    # Fresh copy: no request at all
+    assert tase_data.fetch_page(url, max_age=60) == (page, "cache")
+    assert len(seen) == 2
+
+def test_fetch_serves_stale_copy_when_server_is_down(server, page):
+    url, _, httpd = server
+    tase_data.fetch_page(url, max_age=0)
+    httpd.shutdown()
+    httpd.server_close()
+    assert tase_data.fetch_page(url, max_age=0) == (page, "stale")
+
+def test_fetches_run_concurrently(server, page):
+    url, seen, httpd = server
+    httpd.delay.append(0.3)
+    urls = [f"{url}?expiry={i}" for i in range(4)]   # four cache entries, one slow request each
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(4) as pool: results = list(pool.map(lambda u: tase_data.fetch_page(u, max_age=0), urls))
+    assert results == [(page, "fetched")] * 4 and len(seen) == 4
+    assert time.perf_counter() - t0 < 0.9   # serialized fetches would take 1.2s
+
+def test_fetch_without_cache_or_server():
+    assert tase_data.fetch_page("http://127.0.0.1:9/none", max_age=0) == (None, "error")